@@ -5,31 +5,21 @@ Main RETL Pipeline Runner
 """
 
 import sys
+import argparse
 import logging
+import subprocess
 from pathlib import Path
 import yaml
 from datetime import datetime
 
 # Додати src до path
-sys.path.append(str(Path(__file__).parent / 'src'))
+SRC_DIR = Path(__file__).parent / 'src'
+sys.path.append(str(SRC_DIR))
 
-from extract import Extractor
-from transform import Transformer
+# Extractor/Transformer імпортуються всередині стадій: status і import-звіт їх не потребують
+from log_setup import setup_logging
 
-# Налаштування логування
-log_dir = Path('logs')
-log_dir.mkdir(exist_ok=True)
-
-log_file = log_dir / 'retl.log'
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file, mode='w', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# Логування налаштовується в main(): фоновий запис у logs/retl.jsonl з ротацією
 logger = logging.getLogger(__name__)
 
 def load_config(config_path='config/api_keys.yaml'):
@@ -64,15 +54,18 @@ def initialize_categories(config):
     except Exception as e:
         logger.error(f"Error initializing categories: {e}")
 
-def run_extraction_stage(config):
-    """Виконує Extract стадію для всіх джерел та брендів"""
+def run_extraction_stage(config, source_names=None):
+    """Виконує Extract стадію для всіх джерел (або лише для source_names)"""
+    from extract import Extractor
+
     logger.info("=" * 80)
     logger.info("STAGE 1: EXTRACTION")
     logger.info("=" * 80)
     
     extractor = Extractor()
     extraction_results = []
-    sources = config.get('sources', [])
+    sources = [source for source in config.get('sources', [])
+               if not source_names or source['name'] in source_names]
     for source in sources:
         try:
             logger.info(f"\nExtracting from {source['name']}")
@@ -94,15 +87,22 @@ def run_extraction_stage(config):
         logger.info(f"  {status} {result['source']}: {result['status']}")
     return extraction_results
 
-def run_transformation_stage():
-    """Виконує Transform стадію"""
+def run_transformation_stage(extract_id=None):
+    """Виконує Transform стадію (для всіх успішних extract'ів або лише для extract_id)"""
+    from transform import Transformer
+
     logger.info("\n" + "=" * 80)
     logger.info("STAGE 2: TRANSFORMATION")
     logger.info("=" * 80)
     
     try:
         transformer = Transformer()
-        transformer.transform_all_successful_extracts()
+        if extract_id and transformer.chunked:
+            transformer.transform_extract_chunked(extract_id)
+        elif extract_id:
+            transformer.transform_extract(extract_id)
+        else:
+            transformer.transform_all_successful_extracts()
         logger.info("✓ Transformation completed successfully")
         return True
     except Exception as e:
@@ -126,9 +126,10 @@ def run_load_stage():
 
 def main():
     """Головна функція запуску RETL pipeline"""
+    run_id, _ = setup_logging(log_dir='logs')
     start_time = datetime.now()
     logger.info(f"\n{'=' * 80}")
-    logger.info(f"RETL PIPELINE STARTED: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info(f"RETL PIPELINE STARTED: {start_time.strftime('%Y-%m-%d %H:%M:%S')} (run_id={run_id})")
     logger.info(f"{'=' * 80}\n")
     
     try:
@@ -170,6 +171,240 @@ def main():
         logger.error(f"{'=' * 80}\n")
         return False
 
+def run_scheduler():
+    """Довготривалий режим: адаптивний повторний скрапінг замість щотижневого cron"""
+    from scheduler import RecrawlScheduler
+
+    setup_logging(log_dir='logs')
+    logger.info("RETL SCHEDULER STARTED")
+    RecrawlScheduler().run_forever()
+    return True
+
+def run_worker(processes, extract_id=None, exit_when_idle=False):
+    """Воркер(и) розподіленої черги: можна запускати на кількох машинах проти однієї БД"""
+    from worker import run_workers
+
+    setup_logging(log_dir='logs')
+    run_workers(processes=processes, extract_id=extract_id, exit_when_idle=exit_when_idle)
+    return True
+
+def run_replay(extract_id=None, since_extract_id=None):
+    """Перепарсинг архівованих сторінок у нові extract'и і трансформація в CORE"""
+    from replay import Replayer
+
+    setup_logging(log_dir='logs')
+    logger.info("=" * 80)
+    logger.info("REPLAY FROM PAGE ARCHIVE")
+    logger.info("=" * 80)
+
+    replayed = Replayer().run(extract_ids=[extract_id] if extract_id else None,
+                              since_extract_id=since_extract_id)
+    logger.info(f"Replayed {len(replayed)} extracts: {replayed}")
+    if not replayed:
+        return False
+    return run_transformation_stage()
+
+def run_backfill(restart=False):
+    """Повторна оцінка сентименту відгуків у Review_CORE поточною моделлю"""
+    from backfill import SentimentBackfill
+
+    setup_logging(log_dir='logs')
+    logger.info("=" * 80)
+    logger.info("SENTIMENT BACKFILL")
+    logger.info("=" * 80)
+
+    scored = SentimentBackfill().run(restart=restart)
+    logger.info(f"✓ Backfill completed: {scored} reviews scored")
+    return True
+
+def run_extract(source_names=None):
+    """Лише Extract стадія"""
+    setup_logging(log_dir='logs')
+    results = run_extraction_stage(load_config(), source_names)
+    return any(result['status'] == 'success' for result in results)
+
+def run_transform(extract_id=None):
+    """Лише Transform стадія"""
+    setup_logging(log_dir='logs')
+    return run_transformation_stage(extract_id)
+
+def _status_schema(cursor):
+    cursor.execute('SELECT MAX(sv_version) FROM Schema_VERSION')
+    print(f"Schema version: {cursor.fetchone()[0]}")
+
+def _status_extracts(cursor):
+    cursor.execute('SELECT extract_status, COUNT(*) FROM Extracts GROUP BY extract_status')
+    print("Extracts: " + ", ".join(f"{status}={count}" for status, count in cursor.fetchall()))
+    cursor.execute('''
+        SELECT e.extract_id, s.source_desc, e.extract_datetime, e.extract_status
+        FROM Extracts e JOIN Sources s ON e.extract_fk_source = s.source_id
+        ORDER BY e.extract_id DESC LIMIT 5
+    ''')
+    for extract_id, source_desc, extract_datetime, status in cursor.fetchall():
+        print(f"  #{extract_id} {extract_datetime:%Y-%m-%d %H:%M} {source_desc}: {status}")
+
+def _status_jobs(cursor):
+    cursor.execute('SELECT job_status, COUNT(*) FROM Extract_JOBS GROUP BY job_status')
+    jobs = cursor.fetchall()
+    print("Jobs: " + (", ".join(f"{status}={count}" for status, count in jobs) or "none"))
+
+def _status_backfill(cursor):
+    cursor.execute('''
+        SELECT COUNT(*), SUM(rc_sentiment_model IS NULL) FROM Review_CORE
+    ''')
+    reviews, unscored = cursor.fetchone()
+    print(f"Reviews in CORE: {reviews} (without sentiment model: {unscored or 0})")
+    cursor.execute('''
+        SELECT bp_id, bp_model, bp_last_rc_id, bp_scored, bp_updated FROM Backfill_PROGRESS
+        WHERE bp_status = 'running' ORDER BY bp_id
+    ''')
+    for bp_id, model, last_rc_id, scored, updated in cursor.fetchall():
+        print(f"  Backfill #{bp_id} ({model}): {scored} scored, at rc_id {last_rc_id}, updated {updated}")
+
+def _status_summaries(cursor):
+    cursor.execute('SELECT COUNT(*), MAX(ps_updated) FROM Product_SUMMARY')
+    products, updated = cursor.fetchone()
+    print(f"Product summaries: {products} (last updated {updated})")
+
+STATUS_SECTIONS = [
+    ('Schema version', _status_schema),
+    ('Extracts', _status_extracts),
+    ('Jobs', _status_jobs),
+    ('Reviews in CORE', _status_backfill),
+    ('Product summaries', _status_summaries),
+]
+
+def run_status(config):
+    """Стан pipeline з БД: extract'и, черга задач, backfill. Без LLM і міграцій"""
+    import mysql.connector
+    from mysql.connector import errorcode
+
+    conn = mysql.connector.connect(
+        host=config['mysql']['host'],
+        user=config['mysql']['user'],
+        password=config['mysql']['password'],
+        database=config['mysql']['database'],
+        charset='utf8mb4'
+    )
+    try:
+        cursor = conn.cursor()
+        for title, show in STATUS_SECTIONS:
+            # status не запускає міграції: на старій БД таблиць/колонок секції може ще не бути
+            try:
+                show(cursor)
+            except mysql.connector.errors.ProgrammingError as e:
+                if e.errno not in (errorcode.ER_NO_SUCH_TABLE, errorcode.ER_BAD_FIELD_ERROR):
+                    raise
+                print(f"{title}: not migrated")
+        return True
+    finally:
+        conn.close()
+
+def run_rollups(rebuild_all=False):
+    """Перевіряє агрегати Product_SUMMARY і перераховує ті, що розійшлись з Review_CORE"""
+    import rollup
+    from transform import Transformer
+
+    setup_logging(log_dir='logs')
+    transformer = Transformer()
+    transformer._connect_db()
+    try:
+        cursor = transformer.conn.cursor()
+        if rebuild_all:
+            rollup.rebuild(cursor)
+        else:
+            mismatched = rollup.verify(cursor)
+            logger.info(f"Product summaries out of sync: {len(mismatched)}")
+            rollup.rebuild(cursor, mismatched)
+        transformer.conn.commit()
+        logger.info("✓ Product summaries are consistent with Review_CORE")
+        return True
+    finally:
+        transformer.conn.close()
+
+# Модулі, час імпорту яких перевіряє `python run_retl.py imports`, і бюджет на один модуль
+STARTUP_MODULES = ['extract', 'transform', 'scheduler', 'worker', 'replay', 'backfill']
+STARTUP_BUDGET_MS = 500
+
+def import_times(module):
+    """Імпортує модуль в окремому процесі з -X importtime.
+    Повертає (cumulative_us, [(self_us, імпортований модуль)])"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=SRC_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    cumulative = 0
+    entries = []
+    for line in result.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append((int(self_us), name.strip()))
+        if name.strip() == module:
+            cumulative = int(cumulative_us)
+    return cumulative, sorted(entries, reverse=True)
+
+def run_import_report(budget_ms=None):
+    """Звіт про час імпорту модулів pipeline (config не потрібен). False - хоча б один модуль перевищив бюджет"""
+    budget_ms = budget_ms or STARTUP_BUDGET_MS
+    within_budget = True
+    for module in STARTUP_MODULES:
+        try:
+            cumulative, entries = import_times(module)
+        except RuntimeError as e:
+            print(f"✗ {module}: import failed ({e})")
+            within_budget = False
+            continue
+        ok = cumulative / 1000 <= budget_ms
+        within_budget = within_budget and ok
+        slowest = ", ".join(f"{name} {self_us / 1000:.0f}ms" for self_us, name in entries[:3])
+        print(f"{'✓' if ok else '✗'} {module}: {cumulative / 1000:.0f}ms (slowest: {slowest})")
+    print(f"Budget: {budget_ms}ms per module")
+    return within_budget
+
 if __name__ == "__main__":
-    success = main()
+    parser = argparse.ArgumentParser(description='RETL pipeline runner')
+    parser.add_argument('mode', nargs='?', default='run', choices=['run', 'extract', 'transform', 'status', 'imports',
+                                 'schedule', 'worker', 'replay', 'backfill', 'rollups'],
+                        help="run - один повний прохід (cron), extract/transform - лише одна стадія, "
+                             "status - стан extract'ів, черги і backfill'у, "
+                             "imports - звіт про час імпорту модулів (--budget-ms), "
+                             "schedule - планувальник повторного скрапінгу, "
+                             "worker - воркер розподіленої черги Extract_JOBS, "
+                             "replay - перепарсинг архіву сторінок без мережі, "
+                             "backfill - повторна оцінка сентименту відгуків у CORE, "
+                             "rollups - перевірка і перерахунок агрегатів Product_SUMMARY")
+    parser.add_argument('--processes', type=int, default=1, help='worker: кількість процесів-воркерів')
+    parser.add_argument('--extract-id', type=int,
+                        help='worker: брати задачі лише цього extract; replay, transform: лише цей extract')
+    parser.add_argument('--source', action='append', help='extract: лише джерело з цією назвою (можна кілька разів)')
+    parser.add_argument('--budget-ms', type=int, help=f'imports: бюджет часу імпорту одного модуля, мс (за замовчуванням {STARTUP_BUDGET_MS})')
+    parser.add_argument('--since-extract-id', type=int, help='replay: extract\'и, починаючи з цього ID')
+    parser.add_argument('--exit-when-idle', action='store_true', help='worker: завершитись, коли черга порожня')
+    parser.add_argument('--restart', action='store_true', help='backfill: почати з початку, а не з збереженого прогресу')
+    parser.add_argument('--rebuild', action='store_true', help='rollups: перерахувати агрегати всіх продуктів')
+    args = parser.parse_args()
+
+    if args.mode == 'extract':
+        success = run_extract(args.source)
+    elif args.mode == 'transform':
+        success = run_transform(args.extract_id)
+    elif args.mode == 'status':
+        success = run_status(load_config())
+    elif args.mode == 'imports':
+        success = run_import_report(args.budget_ms)
+    elif args.mode == 'schedule':
+        success = run_scheduler()
+    elif args.mode == 'worker':
+        success = run_worker(args.processes, args.extract_id, args.exit_when_idle)
+    elif args.mode == 'replay':
+        success = run_replay(args.extract_id, args.since_extract_id)
+    elif args.mode == 'backfill':
+        success = run_backfill(args.restart)
+    elif args.mode == 'rollups':
+        success = run_rollups(args.rebuild)
+    else:
+        success = main()
     sys.exit(0 if success else 1)
\ No newline at end of file
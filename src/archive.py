@@ -0,0 +1,62 @@
+"""
+Архів сирих сторінок (пошук і товари) для офлайн-перепарсингу.
+
+Кожна завантажена сторінка стискається zstd і зберігається за sha256 вмісту
+(archive/ab/abcdef....html.zst), тож однакові сторінки з різних запусків
+лежать на диску один раз. Таблиця Page_ARCHIVE індексує сторінки за URL,
+extract_id і типом (search/product). Режим replay (src/replay.py) бере
+сторінки звідси і повторює парсинг, нормалізацію і хешування без мережі.
+"""
+
+import os
+import hashlib
+import logging
+from datetime import datetime
+from pathlib import Path
+
+import queries
+
+logger = logging.getLogger(__name__)
+
+
+class PageArchive:
+    def __init__(self, root='archive', level=10):
+        import zstandard
+
+        self.root = Path(root)
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def _path(self, sha256_hex):
+        return self.root / sha256_hex[:2] / f"{sha256_hex}.html.zst"
+
+    def store(self, html):
+        """Записує сторінку (якщо такої ще немає). Повертає sha256 вмісту (hex)"""
+        data = html.encode('utf-8')
+        sha256_hex = hashlib.sha256(data).hexdigest()
+        path = self._path(sha256_hex)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f'.tmp{os.getpid()}')
+            tmp_path.write_bytes(self._compressor.compress(data))
+            os.replace(tmp_path, path)
+        return sha256_hex
+
+    def load(self, sha256_hex):
+        return self._decompressor.decompress(self._path(sha256_hex).read_bytes()).decode('utf-8')
+
+    def add(self, conn, extract_id, url, kind, html):
+        """Зберігає сторінку і додає запис в Page_ARCHIVE (коміт робить викликач)"""
+        sha256_hex = self.store(html)
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO Page_ARCHIVE (extract_fk_pa, pa_url, pa_kind, pa_sha256, pa_fetched)
+            VALUES (%s, %s, %s, %s, %s)
+        ''', (extract_id, url, kind, bytes.fromhex(sha256_hex), datetime.now()))
+        return sha256_hex
+
+    def pages(self, conn, extract_id, kind):
+        """Повертає [(url, sha256_hex, fetched)] - останню версію кожної сторінки extract'у"""
+        cursor = conn.cursor()
+        cursor.execute(queries.ARCHIVED_PAGES, (extract_id, kind))
+        return [(url, bytes(sha256).hex(), fetched) for url, sha256, fetched in cursor.fetchall()]
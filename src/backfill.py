@@ -0,0 +1,144 @@
+"""
+Повторна оцінка сентименту відгуків у Review_CORE (режим `python run_retl.py backfill`).
+
+Через проблему зі скрапінгом майже всі старі відгуки мають rc_sentiment = neutral,
+а transform_extract вже вставлені рядки не переглядає. Backfill проходить
+Review_CORE keyset-пагінацією по rc_id і бере відгуки, оцінені не поточною
+моделлю (rc_sentiment_model IS NULL або інша модель). Сторінка ділиться на
+запити до LLM по batch_size відгуків, які виконуються паралельно, результати
+пишуться одним UPDATE ... CASE rc_id на сторінку (executemany для UPDATE не
+групується mysql-connector'ом і дав би запит на кожен відгук). Лічильники сентименту в Product_SUMMARY
+коригуються в тій самій транзакції (src/rollup.py).
+
+Прогрес (останній rc_id, кількість оцінених) зберігається в Backfill_PROGRESS в
+тій самій транзакції, що й UPDATE, тож перерваний backfill продовжується з
+останньої закоміченої сторінки. Після зміни моделі в config просто запустіть
+backfill ще раз.
+"""
+
+import time
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import queries
+import rollup
+from log_setup import with_log_context
+from transform import Transformer
+
+logger = logging.getLogger(__name__)
+
+
+class SentimentBackfill:
+    def __init__(self, config_path='config/api_keys.yaml'):
+        self.transformer = Transformer(config_path)
+        self.model = self.transformer.model_name
+
+        backfill_conf = self.transformer.config.get('backfill', {})
+        self.batch_size = backfill_conf.get('batch_size', 20)
+        self.workers = backfill_conf.get('workers', 4)
+
+    @property
+    def conn(self):
+        return self.transformer.conn
+
+    def _start(self, cursor, restart=False):
+        """Повертає (bp_id, last_rc_id, scored) незавершеного backfill'у цієї моделі або новий запис"""
+        if not restart:
+            cursor.execute('''
+                SELECT bp_id, bp_last_rc_id, bp_scored FROM Backfill_PROGRESS
+                WHERE bp_model = %s AND bp_status = 'running'
+                ORDER BY bp_id DESC LIMIT 1
+            ''', (self.model,))
+            row = cursor.fetchone()
+            if row:
+                logger.info(f"Resuming backfill {row['bp_id']} after rc_id {row['bp_last_rc_id']}")
+                return row['bp_id'], row['bp_last_rc_id'], row['bp_scored']
+
+        now = datetime.now()
+        cursor.execute('''
+            INSERT INTO Backfill_PROGRESS (bp_model, bp_started, bp_updated) VALUES (%s, %s, %s)
+        ''', (self.model, now, now))
+        self.conn.commit()
+        return cursor.lastrowid, 0, 0
+
+    def _remaining(self, cursor, last_rc_id):
+        cursor.execute('''
+            SELECT COUNT(*) AS remaining FROM Review_CORE
+            WHERE rc_id > %s AND (rc_sentiment_model IS NULL OR rc_sentiment_model <> %s)
+        ''', (last_rc_id, self.model))
+        return cursor.fetchone()['remaining']
+
+    def _score(self, pool, rows):
+        """Оцінює сторінку відгуків паралельними запитами по batch_size. Повертає [(rc_id, sentiment)]"""
+        batches = [rows[i:i + self.batch_size] for i in range(0, len(rows), self.batch_size)]
+        results = pool.map(with_log_context(self.transformer.analyze_review_sentiment),
+                           [[row['rc_text'] for row in batch] for batch in batches])
+        scored = []
+        for batch, sentiments in zip(batches, results):
+            scored.extend((row['rc_id'], sentiment) for row, sentiment in zip(batch, sentiments))
+        return scored
+
+    def _write(self, cursor, updates):
+        """Пише [(rc_id, sentiment)] одним UPDATE"""
+        cases = ' '.join(['WHEN %s THEN %s'] * len(updates))
+        params = [value for update in updates for value in update]
+        params.append(self.model)
+        params.extend(rc_id for rc_id, _ in updates)
+        cursor.execute(f'''
+            UPDATE Review_CORE
+            SET rc_sentiment = CASE rc_id {cases} END, rc_sentiment_model = %s
+            WHERE rc_id IN ({queries.placeholders(len(updates))})
+        ''', tuple(params))
+
+    def run(self, restart=False):
+        """Оцінює всі відгуки, які потребують (пере)оцінки. Повертає кількість оновлених рядків"""
+        self.transformer._connect_db()
+        cursor = self.conn.cursor(dictionary=True)
+        try:
+            bp_id, last_rc_id, scored_total = self._start(cursor, restart)
+            remaining = self._remaining(cursor, last_rc_id)
+            logger.info(f"Backfill {bp_id} with model {self.model}: {remaining} reviews to score")
+
+            # Клієнт LLM створюється при першому зверненні - створити до запуску потоків
+            self.transformer.llm
+            page_size = self.batch_size * self.workers
+            started = time.monotonic()
+            done = 0
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                while True:
+                    cursor.execute(queries.BACKFILL_BATCH, (last_rc_id, self.model, page_size))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    last_rc_id = rows[-1]['rc_id']
+
+                    # Неоцінені (None) лишаються як є і підхопляться наступним запуском
+                    current = {row['rc_id']: row for row in rows}
+                    updates = [(rc_id, sentiment) for rc_id, sentiment in self._score(pool, rows) if sentiment]
+                    if updates:
+                        self._write(cursor, updates)
+                        rollup.change_sentiments(cursor, [
+                            (current[rc_id]['pc_fk_rc'], current[rc_id]['rc_sentiment'], sentiment)
+                            for rc_id, sentiment in updates])
+                    scored_total += len(updates)
+                    cursor.execute('''
+                        UPDATE Backfill_PROGRESS SET bp_last_rc_id = %s, bp_scored = %s, bp_updated = %s
+                        WHERE bp_id = %s
+                    ''', (last_rc_id, scored_total, datetime.now(), bp_id))
+                    self.conn.commit()
+
+                    done += len(rows)
+                    rate = done / max(time.monotonic() - started, 1e-9)
+                    eta = max(remaining - done, 0) / rate if rate else 0
+                    logger.info("Backfill up to rc_id %s: %s/%s reviews, %.1f reviews/s, ETA %ds",
+                                last_rc_id, done, remaining, rate, eta)
+
+            cursor.execute('''
+                UPDATE Backfill_PROGRESS SET bp_status = 'done', bp_updated = %s WHERE bp_id = %s
+            ''', (datetime.now(), bp_id))
+            self.conn.commit()
+            logger.info(f"Backfill {bp_id} completed: {scored_total} reviews scored with {self.model}")
+            return scored_total
+        finally:
+            self.conn.close()
@@ -0,0 +1,234 @@
+"""
+Пошук майже-дублікатів відгуків (MinHash + LSH).
+
+HTTP-скрапер повертає той самий відгук з різним "сміттям": дата в тексті,
+зайві пробіли, обрізаний текст. MD5 по text|date вважає такі відгуки різними,
+тому перед аналізом сентименту вони згортаються до канонічного відгуку.
+
+Для кожного відгуку рахується MinHash-підпис по словесних шинглах, підпис
+ріжеться на смуги (bands), ключі смуг зберігаються в Review_LSH по продукту.
+Кандидати шукаються за індексом (pc_fk_rl, rl_band, rl_key), тому пошук не
+залежить від розміру Review_CORE; кандидати перевіряються точно по шинглах.
+Обрізаний текст порівнюється за часткою спільних шинглів відносно меншого
+відгуку, але лише якщо відгуки близькі за довжиною (MIN_LENGTH_RATIO): інакше
+довший відгук, що містить короткий і додає свій текст, згорнувся б у нього.
+Для відгуків різної довжини схожість - Jaccard.
+
+Короткі відгуки ("Дуже задоволена!") від різних покупців часто збігаються
+дослівно, тому відгуки з менш ніж MIN_SHINGLES шинглами згортаються лише з
+відгуком тієї самої дати (як і MD5 по text|date).
+
+Ключі в Review_LSH залежать від параметрів нижче. Вони записуються в
+Review_LSH_PARAMS, і при їх зміні ensure_params() перебудовує індекс.
+"""
+
+import re
+import random
+import struct
+import hashlib
+import logging
+from datetime import datetime
+
+import queries
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+MIN_SHINGLES = 4
+MIN_LENGTH_RATIO = 0.8
+SEED = 20240601
+# Змінювати разом з normalize_text/shingles - ключі в Review_LSH тоді треба перебудувати
+NORMALIZATION_VERSION = 1
+LSH_PARAMS = (f'num_perm={NUM_PERM};bands={BANDS};shingle={SHINGLE_SIZE};'
+              f'seed={SEED};normalize={NORMALIZATION_VERSION}')
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(SEED)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(NUM_PERM)]
+
+_DATE_RE = re.compile(r'\d{1,2}\s+[^\W\d_]+\s+\d{4}|\d{1,2}\.\d{1,2}\.\d{4}|\d{4}-\d{2}-\d{2}')
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def normalize_text(text):
+    """Нижній регістр, без дат, пунктуації та повторних пробілів"""
+    text = _DATE_RE.sub(' ', (text or '').lower())
+    return _NON_WORD_RE.sub(' ', text).strip()
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+
+
+def shingles(text):
+    """Множина хешів словесних шинглів нормалізованого тексту"""
+    words = normalize_text(text).split()
+    if len(words) < SHINGLE_SIZE:
+        return {_hash64(' '.join(words).encode('utf-8'))} if words else set()
+    return {_hash64(' '.join(words[i:i + SHINGLE_SIZE]).encode('utf-8'))
+            for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingle_set):
+    if not shingle_set:
+        return (0,) * NUM_PERM
+    return tuple(min((a * x + b) % _MERSENNE_PRIME for x in shingle_set)
+                 for a, b in _PERMUTATIONS)
+
+
+def band_keys(signature):
+    """Список (номер смуги, 63-бітний ключ смуги) для MinHash-підпису"""
+    keys = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS:(band + 1) * ROWS]
+        keys.append((band, _hash64(struct.pack(f'>{ROWS}Q', *chunk)) >> 1))
+    return keys
+
+
+def containment(a, b):
+    """Частка спільних шинглів відносно меншої множини (стійка до обрізаного тексту)"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def similarity(a, b):
+    """containment для відгуків близької довжини, Jaccard - для решти"""
+    if not a or not b:
+        return 0.0
+    if min(len(a), len(b)) >= MIN_LENGTH_RATIO * max(len(a), len(b)):
+        return containment(a, b)
+    return jaccard(a, b)
+
+
+def comparable(a, date_a, b, date_b):
+    """Чи можна вважати відгуки дублікатами: короткі - лише з тією самою датою"""
+    return min(len(a), len(b)) >= MIN_SHINGLES or date_a == date_b
+
+
+class NearDuplicateIndex:
+    """LSH-індекс відгуків у Review_LSH, розбитий по продуктах"""
+
+    def __init__(self, threshold=0.8):
+        self.threshold = threshold
+
+    def signature(self, text):
+        shingle_set = shingles(text)
+        return shingle_set, band_keys(minhash(shingle_set))
+
+    def ensure_params(self, conn):
+        """Перебудовує Review_LSH, якщо він побудований з іншими параметрами (або невідомо з якими)"""
+        cursor = conn.cursor()
+        cursor.execute('SELECT lp_params FROM Review_LSH_PARAMS WHERE lp_id = 1')
+        row = cursor.fetchone()
+        if row and row[0] == LSH_PARAMS:
+            return False
+
+        logger.warning(f"Review_LSH was built with {row[0] if row else 'unknown'} parameters, "
+                       f"rebuilding with {LSH_PARAMS}")
+        cursor.execute('DELETE FROM Review_LSH')
+        conn.commit()
+        last_rc_id = 0
+        while True:
+            cursor.execute('''
+                SELECT rc_id, pc_fk_rc, rc_text FROM Review_CORE
+                WHERE rc_id > %s ORDER BY rc_id LIMIT 1000
+            ''', (last_rc_id,))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_rc_id = rows[-1][0]
+            for rc_id, pc_id, rc_text in rows:
+                self.add(cursor, pc_id, rc_id, self.signature(rc_text)[1])
+            conn.commit()
+
+        cursor.execute('''
+            REPLACE INTO Review_LSH_PARAMS (lp_id, lp_params, lp_updated) VALUES (1, %s, %s)
+        ''', (LSH_PARAMS, datetime.now()))
+        conn.commit()
+        return True
+
+    def _find_in_core(self, cursor, pc_id, shingle_set, keys, date=None):
+        """Повертає (rc_id, схожість) найкращого кандидата з CORE або None (cursor - dictionary)"""
+        conditions = ' OR '.join([queries.LSH_BAND_CONDITION] * len(keys))
+        params = [pc_id]
+        for band, key in keys:
+            params.extend((band, key))
+        cursor.execute(queries.LSH_CANDIDATES.format(conditions=conditions), tuple(params))
+        candidate_ids = [row['rc_fk_rl'] for row in cursor.fetchall()]
+        if not candidate_ids:
+            return None
+
+        placeholders = ', '.join(['%s'] * len(candidate_ids))
+        cursor.execute(f'SELECT rc_id, rc_text, rc_date FROM Review_CORE WHERE rc_id IN ({placeholders})',
+                       tuple(candidate_ids))
+        best = None
+        for row in cursor.fetchall():
+            candidate = shingles(row['rc_text'])
+            if not comparable(shingle_set, date, candidate, row['rc_date']):
+                continue
+            score = similarity(shingle_set, candidate)
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (row['rc_id'], score)
+        return best
+
+    def collapse(self, cursor, reviews):
+        """Згортає майже-дублікати в пачці відгуків.
+
+        reviews - список dict з ключами 'pc_id', 'text' і 'date'. Повертає (unique, duplicates),
+        де duplicates - список (review, canonical, similarity); canonical - або інший
+        dict з unique (rc_id з'явиться після вставки), або {'rc_id': ...} з CORE.
+        """
+        unique = []
+        duplicates = []
+        local_bands = {}
+
+        for review in reviews:
+            shingle_set, keys = self.signature(review['text'])
+            review['_shingles'] = shingle_set
+            review['_bands'] = keys
+
+            # 1) Серед відгуків цієї ж пачки
+            candidates = {i for band, key in keys
+                          for i in local_bands.get((review['pc_id'], band, key), ())}
+            best = None
+            for i in candidates:
+                if not comparable(shingle_set, review.get('date'), unique[i]['_shingles'], unique[i].get('date')):
+                    continue
+                score = similarity(shingle_set, unique[i]['_shingles'])
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (unique[i], score)
+            if best:
+                duplicates.append((review, best[0], best[1]))
+                continue
+
+            # 2) Серед вже збережених у Review_CORE
+            found = self._find_in_core(cursor, review['pc_id'], shingle_set, keys, review.get('date'))
+            if found:
+                duplicates.append((review, {'rc_id': found[0]}, found[1]))
+                continue
+
+            for band, key in keys:
+                local_bands.setdefault((review['pc_id'], band, key), []).append(len(unique))
+            unique.append(review)
+
+        if duplicates:
+            logger.info("Collapsed %s near-duplicate reviews", len(duplicates))
+        return unique, duplicates
+
+    def add(self, cursor, pc_id, rc_id, keys):
+        """Додає ключі смуг збереженого відгуку в Review_LSH"""
+        cursor.executemany('''
+            INSERT IGNORE INTO Review_LSH (pc_fk_rl, rl_band, rl_key, rc_fk_rl)
+            VALUES (%s, %s, %s, %s)
+        ''', [(pc_id, band, key, rc_id) for band, key in keys])
@@ -5,13 +5,20 @@ import hashlib
 import yaml
 from pathlib import Path
 import re
-from dateutil import parser as date_parser
-from dateutil.relativedelta import relativedelta
-from parsera import Parsera
-import requests
-from bs4 import BeautifulSoup
 import os
-from langchain_openai import ChatOpenAI
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# parsera, langchain_openai, requests, bs4 і dateutil імпортуються там, де вони
+# потрібні: status, cleanup і трансформація не повинні платити за їх імпорт
+from llm import create_llm
+from migrations import migrate
+import queries
+from prune import prune_html, estimate_tokens
+from log_setup import set_log_context, log_context, with_log_context
+from archive import PageArchive
+from keywords import KeywordFilter
+from listing import get_listing_extractor
 
 
 
@@ -29,33 +36,45 @@ logger = logging.getLogger(__name__)
 
 class Extractor:
     def __init__(self, config_path='config/api_keys.yaml'):
+        self.config_path = config_path
         self.config = self._load_config(config_path)
         self.conn = None
         self.current_extract_id = None
+        self.current_source_id = None
+
+        # LLM (openrouter.ai, src/llm.py) і Parsera створюються при першому зверненні
+        self._llm = None
+        self._scraper = None
+        # Обрізати HTML перед відправкою в LLM (src/prune.py)
+        self.prune_pages = self.config.get('pruning', {}).get('enabled', True)
+        # Розподілений режим: відгуки продуктів збирають воркери з черги Extract_JOBS
+        self.distributed = self.config.get('distributed', {}).get('enabled', False)
+        # Нативний парсинг сторінок пошуку (src/listing.py), Parsera - лише фолбек
+        listing_conf = self.config.get('listing', {})
+        self.native_listing = listing_conf.get('enabled', True)
+        self.listing_workers = listing_conf.get('max_workers', 4)
+        # Архів сирих сторінок для офлайн-перепарсингу (src/archive.py, режим replay)
+        archive_conf = self.config.get('archive', {})
+        self.archive = None
+        if archive_conf.get('enabled', True):
+            self.archive = PageArchive(archive_conf.get('path', 'archive'), archive_conf.get('level', 10))
+        # include/exclude словники брендів + noise_words (за замовчуванням keywords.DEFAULT_NOISE_WORDS),
+        # скомпільовані в один автомат (src/keywords.py)
+        self.product_filter = KeywordFilter.from_config(self.config)
         
-        # --- LLM via openrouter.ai (Xiaomi MiMo-V2-Flash) ---
-        # Очікується, що config/api_keys.yaml має:
-        # openrouter:
-        #   api_key: "..."
-        #   base_url: "https://openrouter.ai/api/v1"
-        #   model: "mistralai/MiMo-V2-Flash"
-        openrouter_conf = self.config.get('openrouter', {})
-        api_key = openrouter_conf.get('api_key')
-        base_url = openrouter_conf.get('base_url', 'https://openrouter.ai/api/v1')
-        model = openrouter_conf.get('model', 'mistralai/MiMo-V2-Flash')
-
-        # LangChain OpenAI wrapper підтримує кастомний endpoint через openai_api_base
-        self.llm = ChatOpenAI(
-            model=model,
-            openai_api_key=api_key,
-            openai_api_base=base_url,
-            temperature=0.0,
-            timeout=120,
-        )
-
-        self.scraper = Parsera(model=self.llm)
-        self.noise_words = ['parfum', 'eau', 'ml', 'для жінок', 'для чоловіків', 'духи', 'туалетна вода']
-        
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = create_llm(self.config)
+        return self._llm
+
+    @property
+    def scraper(self):
+        if self._scraper is None:
+            from parsera import Parsera
+            self._scraper = Parsera(model=self.llm)
+        return self._scraper
+
     def _load_config(self, path):
         with open(path, 'r', encoding='utf-8') as f:
             return yaml.safe_load(f)
@@ -76,80 +95,18 @@ class Extractor:
             raise
     
     def _init_tables(self):
-        cursor = self.conn.cursor()
-        
-        # Sources table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Sources (
-                source_id INT AUTO_INCREMENT PRIMARY KEY,
-                source_desc VARCHAR(255) UNIQUE NOT NULL
-            )
-        ''')
-        
-        # Brands table (commented: brands were removed from schema)
-        # cursor.execute('''
-        #     CREATE TABLE IF NOT EXISTS Brands (
-        #         brand_id INT AUTO_INCREMENT PRIMARY KEY,
-        #         brand_desc VARCHAR(255) UNIQUE NOT NULL
-        #     )
-        # ''')
-        # Extracts table (no brand)
-        # Previously Extracts included extract_brand FK; kept as comment:
-        # cursor.execute('''
-        #     CREATE TABLE IF NOT EXISTS Extracts (
-        #         extract_id INT AUTO_INCREMENT PRIMARY KEY,
-        #         extract_fk_source INT NOT NULL,
-        #         extract_brand INT NOT NULL,
-        #         extract_datetime DATETIME NOT NULL,
-        #         extract_status ENUM('pending', 'success', 'failed') DEFAULT 'pending',
-        #         FOREIGN KEY (extract_fk_source) REFERENCES Sources(source_id),
-        #         FOREIGN KEY (extract_brand) REFERENCES Brands(brand_id)
-        #     )
-        # ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Extracts (
-                extract_id INT AUTO_INCREMENT PRIMARY KEY,
-                extract_fk_source INT NOT NULL,
-                extract_datetime DATETIME NOT NULL,
-                extract_status ENUM('pending', 'success', 'failed') DEFAULT 'pending',
-                FOREIGN KEY (extract_fk_source) REFERENCES Sources(source_id)
-            )
-        ''')
-        
-        # Product_RAW table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Product_RAW (
-                pr_id INT AUTO_INCREMENT PRIMARY KEY,
-                extract_fk_pr INT NOT NULL,
-                pr_name TEXT NOT NULL,
-                pr_review_count INT NOT NULL,
-                pr_first_seen DATETIME NOT NULL,
-                pr_url_full TEXT NOT NULL,
-                FOREIGN KEY (extract_fk_pr) REFERENCES Extracts(extract_id)
-            )
-        ''')
-        
-        # Review_RAW table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Review_RAW (
-                rr_id INT AUTO_INCREMENT PRIMARY KEY,
-                pr_fk_rr INT NOT NULL,
-                rr_text TEXT NOT NULL,
-                rr_date DATE NOT NULL,
-                rr_hash VARCHAR(32) UNIQUE NOT NULL,
-                FOREIGN KEY (pr_fk_rr) REFERENCES Product_RAW(pr_id)
-            )
-        ''')
-        
-        self.conn.commit()
+        # Схема створюється і оновлюється версійованими міграціями (src/migrations.py)
+        migrate(self.conn)
     
-    def create_extract_entry(self, source_desc):
+    def create_extract_entry(self, source_desc, replay_of=None):
+        """Створює extract у статусі pending. replay_of - оригінальний extract для replay"""
         cursor = self.conn.cursor()
         
         # Отримати або створити source
         cursor.execute('INSERT IGNORE INTO Sources (source_desc) VALUES (%s)', (source_desc,))
-        cursor.execute('SELECT source_id FROM Sources WHERE source_desc = %s', (source_desc,))
+        cursor.execute(queries.SOURCE_ID, (source_desc,))
         source_id = cursor.fetchone()[0]
+        self.current_source_id = source_id
 
         # cursor.execute('INSERT IGNORE INTO Brands (brand_desc) VALUES (%s)', (brand_desc,))
         # cursor.execute('SELECT brand_id FROM Brands WHERE brand_desc = %s', (brand_desc,))
@@ -160,15 +117,84 @@ class Extractor:
         # ''', (source_id, brand_id, datetime.now()))
         
         cursor.execute('''
-            INSERT INTO Extracts (extract_fk_source, extract_datetime, extract_status)
-            VALUES (%s, %s, 'pending')
-        ''', (source_id, datetime.now()))
+            INSERT INTO Extracts (extract_fk_source, extract_datetime, extract_status, extract_replay_of)
+            VALUES (%s, %s, 'pending', %s)
+        ''', (source_id, datetime.now(), replay_of))
         
         self.current_extract_id = cursor.lastrowid
         self.conn.commit()
+        set_log_context(extract_id=self.current_extract_id)
         logger.info(f"Created extract entry with ID: {self.current_extract_id}")
         return self.current_extract_id
     
+    def _take_requests(self, budget, wanted=1):
+        """Скільки з wanted запитів дозволяє бюджет (об'єкт з try_consume(), None - без обмежень)"""
+        if budget is None:
+            return wanted
+        allowed = 0
+        while allowed < wanted and budget.try_consume():
+            allowed += 1
+        return allowed
+
+    def fetch_products(self, source_url, budget=None):
+        """Список продуктів зі сторінки пошуку: нативний парсер, а якщо він нічого не знайшов - Parsera.
+
+        budget - бюджет запитів до джерела (scheduler.TokenBucket): кожна сторінка пошуку
+        і фолбек на Parsera списують по одному запиту.
+        """
+        if self.native_listing:
+            if not self._take_requests(budget):
+                logger.info(f"No request budget left for {source_url}")
+                return []
+            html = self._fetch_html(source_url, kind='search')
+            if html:
+                products = self.fetch_products_native(source_url, html, budget)
+                if any(product['product_reviews_count'] is not None for product in products):
+                    return products
+                if products:
+                    # Без кількості відгуків save_products відкине всі продукти
+                    logger.info(f"Native listing found no review counts on {source_url}")
+            logger.info(f"Native listing found nothing usable on {source_url}, falling back to Parsera")
+
+        if not self._take_requests(budget):
+            logger.info(f"No request budget left for Parsera on {source_url}")
+            return []
+        return self.fetch_products_from_parsera(source_url)
+
+    def fetch_products_native(self, source_url, html, budget=None):
+        """Парсить картки товарів з HTML/JSON-LD усіх сторінок пошуку (сторінки 2..N - паралельно)"""
+        try:
+            overrides = next((source.get('listing') for source in self.config.get('sources', [])
+                              if source.get('url') == source_url), None)
+            listing = get_listing_extractor(source_url, overrides)
+
+            products = {}
+            for product in listing.parse(html, source_url):
+                products.setdefault(product['product_url'], product)
+
+            page_urls = listing.page_urls(html, source_url)
+            affordable = self._take_requests(budget, len(page_urls))
+            if affordable < len(page_urls):
+                logger.info(f"Request budget allows {affordable} of {len(page_urls)} more pages on {source_url}")
+                page_urls = page_urls[:affordable]
+            if page_urls:
+                with ThreadPoolExecutor(max_workers=self.listing_workers) as pool:
+                    pages = list(pool.map(with_log_context(self._http_get), page_urls))
+                # Архів пишеться з основного потоку - з'єднання з БД не потокобезпечне
+                for page_url, page_html in zip(page_urls, pages):
+                    if not page_html:
+                        continue
+                    self._archive_page(page_url, 'search', page_html)
+                    for product in listing.parse(page_html, page_url):
+                        products.setdefault(product['product_url'], product)
+
+            logger.info(f"Fetched {len(products)} products from {source_url} "
+                        f"natively ({len(page_urls) + 1} pages)")
+            return list(products.values())
+        except Exception as e:
+            logger.error(f"Native listing failed for {source_url}: {e}")
+            return []
+
     def fetch_products_from_parsera(self, source_url):
         """Використовує Parsera для отримання списку продуктів"""
         try:
@@ -178,7 +204,7 @@ class Extractor:
                 "product_reviews_count": "Number of reviews"
             }
             
-            result = self.scraper.run(url=source_url, elements=elements)
+            result = self._run_parsera(source_url, elements, kind='search')
             
             # Конвертувати результат в список словників
             products = []
@@ -212,37 +238,106 @@ class Extractor:
             logger.error(f"Error fetching products: {e}")
             return []
     
+    def _archive_page(self, url, kind, html):
+        """Зберігає сторінку в архів з прив'язкою до поточного extract"""
+        if self.archive is None or self.conn is None or not self.current_extract_id:
+            return
+        try:
+            self.archive.add(self.conn, self.current_extract_id, url, kind, html)
+        except Exception as e:
+            logger.warning("Could not archive %s: %s", url, e)
+
+    def _http_get(self, url):
+        """Завантажує сторінку звичайним HTTP запитом. Повертає HTML або None (без БД - можна з потоків)"""
+        import requests
+
+        try:
+            headers = {
+                'User-Agent': 'Mozilla/5.0 (compatible; retl-bot/1.0)'
+            }
+            resp = requests.get(url, headers=headers, timeout=15)
+            if resp.status_code != 200 or not resp.text:
+                return None
+            return resp.text
+        except Exception as e:
+            logger.debug("HTTP fetch failed for %s: %s", url, e)
+            return None
+
+    def _fetch_html(self, url, kind='product'):
+        """Завантажує сторінку і зберігає її в архів. Повертає HTML або None"""
+        html = self._http_get(url)
+        if html:
+            self._archive_page(url, kind, html)
+        return html
+
+    def _run_parsera(self, url, elements, kind='product'):
+        """Запускає Parsera по обрізаному HTML сторінки.
+
+        Сторінку завантажує браузер Parsera (PageLoader) - Parsera є фолбеком саме для
+        сторінок, які рендеряться JavaScript'ом, тому HTML від requests тут не підходить.
+        Відрендерений HTML обрізається перед LLM і зберігається в архів. Якщо
+        обрізання вимкнене або не вдалось - Parsera.run(), як і раніше.
+        """
+        if not self.prune_pages:
+            return self.scraper.run(url=url, elements=elements)
+        try:
+            html, result = asyncio.run(self._run_parsera_pruned(url, elements))
+        except Exception as e:
+            logger.warning("Pruned Parsera run failed for %s, using Parsera.run(): %s", url, e)
+            return self.scraper.run(url=url, elements=elements)
+        # Архів пишеться поза event loop'ом, з основного потоку
+        self._archive_page(url, kind, html)
+        return result
+
+    async def _run_parsera_pruned(self, url, elements):
+        """Рендерить сторінку браузером Parsera і запускає екстрактор по обрізаному HTML"""
+        html = await self.scraper.loader.load_content(url)
+        pruned = prune_html(html)
+        logger.info("Pruned page for LLM %s: ~%s -> ~%s tokens", url, estimate_tokens(html), estimate_tokens(pruned))
+
+        # Той самий екстрактор, який Parsera використовує всередині run(), але з нашим контентом
+        extractor_cls = getattr(self.scraper.extractor, 'value', self.scraper.extractor)
+        extractor = extractor_cls(elements=elements, model=self.llm, content=pruned)
+        return html, await extractor.run()
+
     def is_valid_product(self, product_name):
-        """Перевіряє, чи продукт не містить шумових слів"""
-        product_lower = product_name.lower()
-        if any(noise in product_lower for noise in self.noise_words):
-            return False
-        return True
+        """Перевіряє, чи продукт містить слово бренду і не містить шумових слів"""
+        return self.product_filter.match(product_name) is not None
     
+    def save_product(self, product_name, full_url, review_count):
+        """Додає продукт до поточного extract (без коміту). Повертає pr_id"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            INSERT INTO Product_RAW (extract_fk_pr, pr_name, pr_review_count, pr_first_seen, pr_url_full)
+            VALUES (%s, %s, %s, %s, %s)
+        ''', (self.current_extract_id, product_name, review_count, datetime.now(), full_url))
+        return cursor.lastrowid
+
     def save_products(self, products, base_domain):
         """Зберігає відфільтровані продукти в БД"""
-        cursor = self.conn.cursor()
         saved_count = 0
         
         for product in products:
-            if product['product_reviews_count'] >= 1 and self.is_valid_product(product['product_name']):
+            if (product['product_reviews_count'] or 0) >= 1 and self.is_valid_product(product['product_name']):
                 full_url = base_domain + product['product_url']
-                
-                cursor.execute('''
-                    INSERT INTO Product_RAW (extract_fk_pr, pr_name, pr_review_count, pr_first_seen, pr_url_full)
-                    VALUES (%s, %s, %s, %s, %s)
-                ''', (self.current_extract_id, product['product_name'], 
-                      product['product_reviews_count'], datetime.now(), full_url))
-                
+                self.save_product(product['product_name'], full_url, product['product_reviews_count'])
                 saved_count += 1
         
         self.conn.commit()
         logger.info(f"Saved {saved_count} valid products")
         return saved_count
     
-    def normalize_date(self, date_str):
-        """Нормалізує дату з різних форматів до YYYY-MM-DD"""
-        date_str = date_str.strip().lower()
+    def normalize_date(self, date_str, reference=None):
+        """Нормалізує дату з різних форматів до YYYY-MM-DD.
+
+        Відносні дати ("2 дні тому", "вчора") і нерозпізнані рахуються від reference -
+        часу завантаження сторінки (для replay з архіву), за замовчуванням - від зараз.
+        """
+        from dateutil import parser as date_parser
+        from dateutil.relativedelta import relativedelta
+
+        now = reference or datetime.now()
+        date_str = (date_str or '').strip().lower()
         
         # Карта місяців
         months_uk = {
@@ -254,13 +349,13 @@ class Extractor:
         # "2 дня назад", "Вчера", "Today"
         if 'назад' in date_str or 'тому' in date_str:
             days = int(re.search(r'\d+', date_str).group()) if re.search(r'\d+', date_str) else 1
-            return (datetime.now() - relativedelta(days=days)).strftime('%Y-%m-%d')
+            return (now - relativedelta(days=days)).strftime('%Y-%m-%d')
         
         if 'вчора' in date_str or 'yesterday' in date_str:
-            return (datetime.now() - relativedelta(days=1)).strftime('%Y-%m-%d')
+            return (now - relativedelta(days=1)).strftime('%Y-%m-%d')
         
         if 'today' in date_str or 'сьогодні' in date_str:
-            return datetime.now().strftime('%Y-%m-%d')
+            return now.strftime('%Y-%m-%d')
         
         # "06 серпня 2022"
         for month_name, month_num in months_uk.items():
@@ -272,35 +367,39 @@ class Extractor:
         
         # Спроба стандартного парсингу
         try:
-            parsed = date_parser.parse(date_str, dayfirst=True)
+            parsed = date_parser.parse(date_str, dayfirst=True, default=now)
             return parsed.strftime('%Y-%m-%d')
         except:
-            return datetime.now().strftime('%Y-%m-%d')
+            return now.strftime('%Y-%m-%d')
     
     def create_review_hash(self, text, date):
-        """Створює MD5 хеш для відгуку"""
+        """Створює MD5 хеш для відгуку (16 байт, колонка BINARY(16))"""
         combined = f"{text}|{date}"
-        return hashlib.md5(combined.encode('utf-8')).hexdigest()
+        return hashlib.md5(combined.encode('utf-8')).digest()
     
-    def fetch_reviews_from_parsera(self, product_url):
+    def fetch_reviews_from_parsera(self, product_url, budget=None):
         """Отримує відгуки для продукту.
 
         Спробувати парсинг через HTTP (BeautifulSoup) — якщо не вдасться,
-        повернутися до Parsera (може піднімати браузер).
+        повернутися до Parsera (може піднімати браузер). budget - бюджет запитів
+        до джерела: HTTP-запит списує викликач, фолбек на Parsera - ще один запит.
         """
         try:
             # 1) HTTP парсинг першочергово
             http_reviews = self._fetch_reviews_via_http(product_url)
             if http_reviews:
-                logger.info(f"Fetched {len(http_reviews)} reviews from {product_url} via HTTP")
+                logger.info("Fetched %s reviews from %s via HTTP", len(http_reviews), product_url)
                 return http_reviews
 
-            # 2) Фолбек на Parsera (може запускати браузер)
+            # 2) Фолбек на Parsera: браузер рендерить JavaScript, якого немає в HTTP-відповіді
+            if not self._take_requests(budget):
+                logger.info(f"No request budget left for Parsera on {product_url}")
+                return []
             elements = {
                 "review_text": "Review text or comment",
                 "review_date": "Review date"
             }
-            result = self.scraper.run(url=product_url, elements=elements)
+            result = self._run_parsera(product_url, elements)
 
             reviews = []
             if result and len(result) > 0:
@@ -310,27 +409,26 @@ class Extractor:
                         'review_date': item.get('review_date', '')
                     })
 
-            logger.info(f"Fetched {len(reviews)} reviews from {product_url} via Parsera")
+            logger.info("Fetched %s reviews from %s via Parsera", len(reviews), product_url)
             return reviews
 
         except Exception as e:
             logger.error(f"Error fetching reviews: {e}")
             return []
 
-    def _fetch_reviews_via_http(self, product_url):
+    def _fetch_reviews_via_http(self, product_url, html=None):
         """Спроба отримати відгуки звичайним HTTP парсингом.
 
         Повертає список dict({'review_text', 'review_date'}) або пустий список.
         """
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (compatible; retl-bot/1.0)'
-            }
-            resp = requests.get(product_url, headers=headers, timeout=15)
-            if resp.status_code != 200 or not resp.text:
+            if html is None:
+                html = self._fetch_html(product_url)
+            if not html:
                 return []
 
-            soup = BeautifulSoup(resp.text, 'html.parser')
+            from bs4 import BeautifulSoup
+            soup = BeautifulSoup(html, 'html.parser')
 
             # Пробуємо знайти елементи з різними селекторами, які часто містять відгуки
             candidates = []
@@ -374,28 +472,29 @@ class Extractor:
 
             return uniq
         except Exception as e:
-            logger.debug(f"HTTP reviews parse failed for {product_url}: {e}")
+            logger.debug("HTTP reviews parse failed for %s: %s", product_url, e)
             return []
     
-    def save_reviews(self, product_id, reviews):
-        """Зберігає відгуки в БД"""
+    def save_reviews(self, product_id, reviews, fetched_at=None):
+        """Зберігає відгуки в БД. fetched_at - час завантаження сторінки (для відносних дат)"""
         cursor = self.conn.cursor()
         saved_count = 0
         
         for review in reviews:
             try:
-                normalized_date = self.normalize_date(review['review_date'])
+                normalized_date = self.normalize_date(review['review_date'], reference=fetched_at)
                 review_hash = self.create_review_hash(review['review_text'], normalized_date)
                 
                 cursor.execute('''
-                    INSERT IGNORE INTO Review_RAW (pr_fk_rr, rr_text, rr_date, rr_hash)
-                    VALUES (%s, %s, %s, %s)
-                ''', (product_id, review['review_text'], normalized_date, review_hash))
+                    INSERT IGNORE INTO Review_RAW (pr_fk_rr, rr_text, rr_date, rr_hash, source_fk_rr)
+                    VALUES (%s, %s, %s, %s, %s)
+                ''', (product_id, review['review_text'], normalized_date, review_hash,
+                      self.current_source_id))
                 
                 if cursor.rowcount > 0:
                     saved_count += 1
             except Exception as e:
-                logger.error(f"Error saving review: {e}")
+                logger.error("Error saving review: %s", e)
         
         self.conn.commit()
         return saved_count
@@ -405,11 +504,11 @@ class Extractor:
         if self.current_extract_id:
             cursor = self.conn.cursor()
             
+            # Видалити задачі розподіленої черги (посилаються на Product_RAW)
+            cursor.execute('DELETE FROM Extract_JOBS WHERE extract_fk_job = %s', (self.current_extract_id,))
+            
             # Видалити reviews
-            cursor.execute('''
-                DELETE FROM Review_RAW 
-                WHERE pr_fk_rr IN (SELECT pr_id FROM Product_RAW WHERE extract_fk_pr = %s)
-            ''', (self.current_extract_id,))
+            cursor.execute(queries.CLEANUP_REVIEWS, (self.current_extract_id,))
             
             # Видалити products
             cursor.execute('DELETE FROM Product_RAW WHERE extract_fk_pr = %s', (self.current_extract_id,))
@@ -474,7 +573,7 @@ class Extractor:
             self._connect_db()
             self.create_extract_entry(source_desc)
             logger.info(f"Fetching products from {source_url}")
-            products = self.fetch_products_from_parsera(source_url)
+            products = self.fetch_products(source_url)
             if not products:
                 logger.warning("No products found")
                 self.update_extract_status('failed')
@@ -484,18 +583,25 @@ class Extractor:
                 logger.warning("No valid products to save")
                 self.update_extract_status('failed')
                 return 'failed'
+            if self.distributed:
+                from worker import enqueue_jobs, Worker
+                enqueue_jobs(self.conn, self.current_extract_id)
+                # Цей процес теж працює як воркер, доки всі задачі extract'у не закриті
+                Worker(self.config_path).run(extract_id=self.current_extract_id)
+                status = self.get_extract_status()
+                logger.info(f"Distributed extraction finished: {saved_products} products, status {status}")
+                return status
             cursor = self.conn.cursor(dictionary=True)
-            cursor.execute('''
-                SELECT pr_id, pr_url_full FROM Product_RAW WHERE extract_fk_pr = %s
-            ''', (self.current_extract_id,))
+            cursor.execute(queries.EXTRACT_PRODUCTS, (self.current_extract_id,))
             products_list = cursor.fetchall()
             total_reviews = 0
             for product in products_list:
-                logger.info(f"Fetching reviews for product {product['pr_id']}")
-                reviews = self.fetch_reviews_from_parsera(product['pr_url_full'])
-                saved = self.save_reviews(product['pr_id'], reviews)
-                total_reviews += saved
-                logger.info(f"Saved {saved} reviews for product {product['pr_id']}")
+                with log_context(product_id=product['pr_id']):
+                    logger.info("Fetching reviews for product %s", product['pr_id'])
+                    reviews = self.fetch_reviews_from_parsera(product['pr_url_full'])
+                    saved = self.save_reviews(product['pr_id'], reviews)
+                    total_reviews += saved
+                    logger.info("Saved %s reviews for product %s", saved, product['pr_id'])
             self.update_extract_status('success')
             logger.info(f"Extraction completed: {saved_products} products, {total_reviews} reviews")
             status = 'success'
@@ -0,0 +1,137 @@
+"""
+Фільтр продуктів за ключовими словами брендів (Aho-Corasick).
+
+Правила з дизайну pipeline: назва продукту має містити хоча б одне слово зі
+словника бренду (include) і не містити слів-шуму (exclude бренду або глобальні
+noise_words). Усі словники компілюються в один автомат, тож перевірка назви -
+один прохід по рядку незалежно від кількості брендів і слів.
+
+Назви і ключові слова нормалізуються однаково: нижній регістр, транслітерація
+кирилиці (uk/ru) в латиницю, все крім букв і цифр - пробіл. Букви, які uk і ru
+читають по-різному (и/і/ы/y, е/є/э), після транслітерації зводяться до одного
+символу, тому "Санвіта", "Санвита" і "sanvita" збігаються. Слово має стояти на
+межі букв: "eau" не знайдеться в "beauty", а "ml" знайдеться в "50ml".
+"""
+
+import re
+from collections import deque
+
+_TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'ґ': 'g', 'д': 'd', 'е': 'e', 'є': 'e',
+    'ё': 'e', 'ж': 'zh', 'з': 'z', 'и': 'y', 'і': 'i', 'ї': 'i', 'й': 'i', 'к': 'k',
+    'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't',
+    'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'iu', 'я': 'ia', "'": '', '’': '', 'ʼ': '',
+}
+_TRANSLIT_TABLE = str.maketrans(_TRANSLIT)
+# Після транслітерації: "и" (uk - y, ru - i), "ы" і латинська y -> i
+_FOLD_TABLE = str.maketrans({'y': 'i'})
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+
+DEFAULT_NOISE_WORDS = ['parfum', 'eau', 'ml', 'для жінок', 'для чоловіків', 'духи', 'туалетна вода']
+
+
+def normalize(text):
+    """Нижній регістр + транслітерація (uk/ru зведені) + лише [a-z0-9] з одинарними пробілами"""
+    text = (text or '').lower().translate(_TRANSLIT_TABLE).translate(_FOLD_TABLE)
+    return ' ' + _NON_ALNUM_RE.sub(' ', text).strip() + ' '
+
+
+class AhoCorasick:
+    """Автомат для пошуку багатьох шаблонів за один прохід по тексту"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+    def add(self, pattern, payload):
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = next_node
+        self._out[node].append((len(pattern), payload))
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        return self
+
+    def iter_matches(self, text):
+        """Повертає (start, end, payload) для кожного входження шаблону"""
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, payload in self._out[node]:
+                yield i - length + 1, i + 1, payload
+
+
+class KeywordFilter:
+    """Компілює include/exclude словники брендів і глобальні noise_words в один автомат"""
+
+    def __init__(self, brands=None, noise_words=None):
+        self.brands = [brand['name'] for brand in brands or []]
+        self._automaton = AhoCorasick()
+        for word in noise_words if noise_words is not None else DEFAULT_NOISE_WORDS:
+            self._add(word, (None, 'exclude'))
+        for brand in brands or []:
+            for word in brand.get('include', []):
+                self._add(word, (brand['name'], 'include'))
+            for word in brand.get('exclude', []):
+                self._add(word, (brand['name'], 'exclude'))
+        self._automaton.build()
+
+    @classmethod
+    def from_config(cls, config):
+        filters_conf = config.get('filters', {})
+        return cls(brands=filters_conf.get('brands'),
+                   noise_words=filters_conf.get('noise_words'))
+
+    def _add(self, word, payload):
+        pattern = normalize(word).strip()
+        if pattern:
+            self._automaton.add(pattern, payload)
+
+    def _matches(self, product_name):
+        text = normalize(product_name)
+        for start, end, payload in self._automaton.iter_matches(text):
+            # Межа слова: поруч не повинно бути букви (цифри дозволені - "50ml")
+            if text[start - 1].isalpha() or text[end].isalpha():
+                continue
+            yield payload
+
+    def match(self, product_name):
+        """Повертає назву бренду, якому відповідає продукт, '' якщо бренди не задані,
+        або None, якщо продукт відфільтровано"""
+        included = set()
+        excluded = set()
+        for brand, kind in self._matches(product_name):
+            if kind == 'include':
+                included.add(brand)
+            elif brand is None:
+                return None
+            else:
+                excluded.add(brand)
+
+        if not self.brands:
+            return ''
+        for brand in self.brands:
+            if brand in included and brand not in excluded:
+                return brand
+        return None
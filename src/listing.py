@@ -0,0 +1,160 @@
+"""
+Нативний (без LLM) парсинг сторінок пошуку.
+
+Картки товарів (назва, URL, кількість відгуків) беруться напряму з HTML або з
+вбудованого JSON-LD (ItemList / Product з aggregateRating). Кількість сторінок
+визначається з посилань пагінації, решта сторінок завантажується паралельно.
+Parsera лишається фолбеком, якщо нативний парсер нічого не знайшов.
+
+Екстрактори налаштовуються по домену: шаблон URL товару і т.ін. Невідомі
+домени обробляються загальним екстрактором з типовим шаблоном /product/<id>/.
+"""
+
+import re
+import json
+import logging
+from urllib.parse import urlparse, urljoin
+
+logger = logging.getLogger(__name__)
+
+# "12 відгуків" або "Відгуки: 12" / "Reviews (12)"
+_REVIEW_COUNT_RE = re.compile(
+    r'(\d+)\s*(?:відгук|отзыв|review|коментар|комментар)'
+    r'|(?:відгук|отзыв|review|коментар|комментар)\w*\s*[:(]\s*(\d+)', re.IGNORECASE)
+_PAGE_PARAM_RE = re.compile(r'([?&](?:page|p|PAGEN_\d+)=)(\d+)')
+_PAGE_PATH_RE = re.compile(r'(/page[-/])(\d+)')
+
+
+class ListingExtractor:
+    def __init__(self, product_url_pattern=r'/product/\d+/?', max_pages=20):
+        self.product_url_re = re.compile(product_url_pattern)
+        self.max_pages = max_pages
+
+    def _relative(self, href, page_url):
+        """URL товару у вигляді шляху (як його повертає Parsera: /ua/product/123/)"""
+        parsed = urlparse(urljoin(page_url, href))
+        return parsed.path + (f'?{parsed.query}' if parsed.query else '')
+
+    def _from_json_ld(self, soup, page_url):
+        products = {}
+
+        def visit(node):
+            if isinstance(node, list):
+                for item in node:
+                    visit(item)
+                return
+            if not isinstance(node, dict):
+                return
+            node_type = node.get('@type')
+            if node_type == 'ItemList':
+                for element in node.get('itemListElement', []):
+                    visit(element.get('item', element) if isinstance(element, dict) else element)
+            elif node_type == 'Product' or (node_type == 'ListItem' and node.get('url')):
+                url = node.get('url') or node.get('@id')
+                if url and self.product_url_re.search(url):
+                    rating = node.get('aggregateRating') or {}
+                    count = rating.get('reviewCount', rating.get('ratingCount'))
+                    products[self._relative(url, page_url)] = {
+                        'product_name': node.get('name', ''),
+                        'product_url': self._relative(url, page_url),
+                        'product_reviews_count': int(count) if str(count).isdigit() else None,
+                    }
+            for key in ('@graph', 'mainEntity'):
+                if key in node:
+                    visit(node[key])
+
+        for script in soup.find_all('script', type='application/ld+json'):
+            try:
+                visit(json.loads(script.string or ''))
+            except (ValueError, TypeError):
+                continue
+        return products
+
+    def _card(self, anchor, product_path, page_url):
+        """Найбільший предок посилання, який містить лише цей товар"""
+        card = anchor
+        for parent in anchor.parents:
+            if parent.name in ('body', '[document]'):
+                break
+            paths = {self._relative(a['href'], page_url) for a in parent.find_all('a', href=True)
+                     if self.product_url_re.search(a['href'])}
+            if paths != {product_path}:
+                break
+            card = parent
+        return card
+
+    def _from_html(self, soup, page_url):
+        products = {}
+        for anchor in soup.find_all('a', href=True):
+            if not self.product_url_re.search(anchor['href']):
+                continue
+            path = self._relative(anchor['href'], page_url)
+            name = anchor.get_text(' ', strip=True) or anchor.get('title', '')
+            known = products.get(path)
+            if known:
+                # Кілька посилань на товар (картинка, назва) - беремо найдовший текст
+                if len(name) > len(known['product_name']):
+                    known['product_name'] = name
+                continue
+
+            card = self._card(anchor, path, page_url)
+            match = _REVIEW_COUNT_RE.search(card.get_text(' ', strip=True))
+            products[path] = {
+                'product_name': name,
+                'product_url': path,
+                # None - кількість на картці не знайдена (невідома, а не нуль)
+                'product_reviews_count': int(match.group(1) or match.group(2)) if match else None,
+            }
+        return products
+
+    def parse(self, html, page_url):
+        """Товари зі сторінки пошуку: JSON-LD має пріоритет, HTML доповнює.
+        product_reviews_count = None, якщо кількість відгуків не знайдена"""
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, 'html.parser')
+        products = self._from_html(soup, page_url)
+        for path, product in self._from_json_ld(soup, page_url).items():
+            merged = products.setdefault(path, product)
+            if product['product_name']:
+                merged['product_name'] = product['product_name']
+            counts = [count for count in (merged['product_reviews_count'], product['product_reviews_count'])
+                      if count is not None]
+            merged['product_reviews_count'] = max(counts) if counts else None
+        return [product for product in products.values() if product['product_name']]
+
+    def page_urls(self, html, page_url):
+        """URL сторінок 2..N, знайдені за посиланнями пагінації"""
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, 'html.parser')
+        template = None
+        last_page = 1
+        for anchor in soup.find_all('a', href=True):
+            href = urljoin(page_url, anchor['href'])
+            for pattern in (_PAGE_PARAM_RE, _PAGE_PATH_RE):
+                match = pattern.search(href)
+                if match and int(match.group(2)) > last_page:
+                    last_page = int(match.group(2))
+                    template = (pattern, href)
+        if template is None:
+            return []
+
+        pattern, href = template
+        last_page = min(last_page, self.max_pages)
+        return [pattern.sub(lambda m: f'{m.group(1)}{page}', href, count=1)
+                for page in range(2, last_page + 1)]
+
+
+# Екстрактори по доменах (без www.)
+LISTING_EXTRACTORS = {
+    'makeup.com.ua': ListingExtractor(product_url_pattern=r'/ua/product/\d+/?'),
+}
+
+
+def get_listing_extractor(url, overrides=None):
+    """Екстрактор для домену URL. overrides - параметри з config (sources[].listing)"""
+    domain = urlparse(url).netloc.lower()
+    if domain.startswith('www.'):
+        domain = domain[4:]
+    if overrides:
+        return ListingExtractor(**overrides)
+    return LISTING_EXTRACTORS.get(domain) or ListingExtractor()
@@ -0,0 +1,33 @@
+"""
+Клієнт LLM (openrouter.ai через LangChain ChatOpenAI).
+
+langchain_openai імпортується лише тут і лише при створенні клієнта, тому
+запуски, які не звертаються до LLM (status, cleanup, трансформація без нових
+відгуків), не платять за імпорт і налаштування клієнта.
+"""
+
+
+def create_llm(config):
+    """Створює ChatOpenAI за секцією openrouter з config.
+
+    Очікується, що config/api_keys.yaml має:
+    openrouter:
+      api_key: "..."
+      base_url: "https://openrouter.ai/api/v1"
+      model: "mistralai/MiMo-V2-Flash"
+    """
+    from langchain_openai import ChatOpenAI
+
+    openrouter_conf = config.get('openrouter', {})
+    # LangChain OpenAI wrapper підтримує кастомний endpoint через openai_api_base
+    return ChatOpenAI(
+        model=model_name(config),
+        openai_api_key=openrouter_conf.get('api_key'),
+        openai_api_base=openrouter_conf.get('base_url', 'https://openrouter.ai/api/v1'),
+        temperature=0.0,
+        timeout=120,
+    )
+
+
+def model_name(config):
+    return config.get('openrouter', {}).get('model', 'mistralai/MiMo-V2-Flash')
@@ -0,0 +1,121 @@
+"""
+Логування RETL: фоновий запис через QueueHandler/QueueListener у JSON lines.
+
+Гарячі цикли (збереження відгуків, трансформація) лише кладуть запис у чергу,
+а форматування і запис у файл робить окремий потік. Кожен рядок у
+logs/retl.jsonl містить run_id, extract_id та product_id поточного контексту,
+тому логи минулих запусків можна фільтрувати (jq, pandas). Файл ротується
+за розміром і на старті кожного запуску - попередні запуски не перезаписуються.
+"""
+
+import os
+import json
+import atexit
+import logging
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from queue import Queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+CONTEXT_FIELDS = ('run_id', 'extract_id', 'product_id', 'worker')
+
+_log_context = contextvars.ContextVar('retl_log_context', default={})
+
+
+def set_log_context(**fields):
+    """Додає поля (run_id, extract_id, product_id) до всіх наступних записів логу"""
+    _log_context.set({**_log_context.get(), **fields})
+
+
+def with_log_context(func):
+    """Обгортає func для пулу потоків: виклики бачать поля логу потоку, який обгорнув.
+
+    Потоки ThreadPoolExecutor не успадковують contextvars, тож без обгортки записи
+    з них не мають run_id/extract_id. Кожен виклик отримує свою копію контексту -
+    один Context не можна виконувати в кількох потоках одночасно.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return run
+
+
+@contextmanager
+def log_context(**fields):
+    """Тимчасово додає поля до записів логу всередині блоку with"""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Переносить поля контексту в запис. Працює в потоці, який логує
+    (у пулах потоків - через with_log_context)"""
+
+    def filter(self, record):
+        context = _log_context.get()
+        for field in CONTEXT_FIELDS:
+            setattr(record, field, context.get(field))
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(log_dir='logs', run_id=None, level=logging.INFO,
+                  max_bytes=10 * 1024 * 1024, backup_count=20,
+                  filename='retl.jsonl', rotate_on_start=True):
+    """Налаштовує root logger. Повертає (run_id, listener).
+
+    Кожен процес має писати у свій filename: RotatingFileHandler не розрахований
+    на кілька процесів, що ротують один файл.
+    """
+    log_dir = Path(log_dir)
+    log_dir.mkdir(exist_ok=True)
+    run_id = run_id or f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+    file_handler = RotatingFileHandler(log_dir / filename, maxBytes=max_bytes,
+                                       backupCount=backup_count, encoding='utf-8')
+    # Ротація на старті запуску: кожен запуск починає свій файл
+    if rotate_on_start and file_handler.stream.tell() > 0:
+        file_handler.doRollover()
+    file_handler.setFormatter(JsonLinesFormatter())
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    queue = Queue(-1)
+    queue_handler = QueueHandler(queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = QueueListener(queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    set_log_context(run_id=run_id)
+    return run_id, listener
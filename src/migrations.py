@@ -0,0 +1,413 @@
+"""
+Версійовані міграції схеми RETL.
+
+Кожен крок має номер версії і є ідемпотентним: перед зміною він перевіряє
+поточний стан через information_schema, тому повторний запуск (або запуск на
+частково мігрованій БД) нічого не ламає. Застосовані версії пишуться в
+Schema_VERSION. Кроки не викликають код фіч (dedup, rollup): SQL і параметри,
+на які вони спираються, зафіксовані в самому кроці, тож поведінка вже
+застосованої міграції не змінюється разом з модулями.
+
+Запуск:
+    python src/migrations.py migrate   # застосувати відсутні міграції
+    python src/migrations.py check     # EXPLAIN для запитів pipeline, пошук full scan
+"""
+
+import sys
+import logging
+from datetime import datetime
+import yaml
+import mysql.connector
+
+import queries
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK = 'retl_schema_migrations'
+
+
+def _column_type(cursor, table, column):
+    """Повертає DATA_TYPE колонки або None, якщо колонки немає"""
+    cursor.execute('''
+        SELECT DATA_TYPE FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    ''', (table, column))
+    row = cursor.fetchone()
+    return row[0].lower() if row else None
+
+
+def _index_exists(cursor, table, index):
+    cursor.execute('''
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    ''', (table, index))
+    return cursor.fetchone()[0] > 0
+
+
+def _add_index(cursor, table, index, definition):
+    if not _index_exists(cursor, table, index):
+        cursor.execute(f'ALTER TABLE {table} ADD INDEX {index} {definition}')
+        logger.info(f"Added index {table}.{index}")
+
+
+def _add_column(cursor, table, column, definition):
+    if _column_type(cursor, table, column) is None:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        logger.info(f"Added column {table}.{column}")
+
+
+# --- Кроки міграцій ---
+
+def _baseline(cursor):
+    """Початкова схема (як її раніше створювали Extractor і Transformer)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Sources (
+            source_id INT AUTO_INCREMENT PRIMARY KEY,
+            source_desc VARCHAR(255) UNIQUE NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Extracts (
+            extract_id INT AUTO_INCREMENT PRIMARY KEY,
+            extract_fk_source INT NOT NULL,
+            extract_datetime DATETIME NOT NULL,
+            extract_status ENUM('pending', 'success', 'failed') DEFAULT 'pending',
+            FOREIGN KEY (extract_fk_source) REFERENCES Sources(source_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Product_RAW (
+            pr_id INT AUTO_INCREMENT PRIMARY KEY,
+            extract_fk_pr INT NOT NULL,
+            pr_name TEXT NOT NULL,
+            pr_review_count INT NOT NULL,
+            pr_first_seen DATETIME NOT NULL,
+            pr_url_full TEXT NOT NULL,
+            FOREIGN KEY (extract_fk_pr) REFERENCES Extracts(extract_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Review_RAW (
+            rr_id INT AUTO_INCREMENT PRIMARY KEY,
+            pr_fk_rr INT NOT NULL,
+            rr_text TEXT NOT NULL,
+            rr_date DATE NOT NULL,
+            rr_hash VARCHAR(32) UNIQUE NOT NULL,
+            FOREIGN KEY (pr_fk_rr) REFERENCES Product_RAW(pr_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Product_CORE (
+            pc_id INT AUTO_INCREMENT PRIMARY KEY,
+            pc_desc TEXT NOT NULL,
+            pc_hash VARCHAR(32) UNIQUE NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Review_CORE (
+            rc_id INT AUTO_INCREMENT PRIMARY KEY,
+            pc_fk_rc INT NOT NULL,
+            rc_text TEXT NOT NULL,
+            rc_source INT NOT NULL,
+            rc_date DATE NOT NULL,
+            rc_sentiment ENUM('negative', 'neutral', 'positive'),
+            rc_hash VARCHAR(32) UNIQUE NOT NULL,
+            FOREIGN KEY (pc_fk_rc) REFERENCES Product_CORE(pc_id)
+        )
+    ''')
+
+
+def _add_pipeline_indexes(cursor):
+    """Індекси під гарячі запити extract/transform/cleanup та дашборди"""
+    _add_index(cursor, 'Product_RAW', 'idx_pr_extract_name', '(extract_fk_pr, pr_name(191))')
+    _add_index(cursor, 'Extracts', 'idx_extract_status_source', '(extract_status, extract_fk_source)')
+    _add_index(cursor, 'Review_CORE', 'idx_rc_product_date', '(pc_fk_rc, rc_date)')
+
+
+def _convert_hash_column(cursor, table, column):
+    """Переводить hex MD5 у VARCHAR(32) на BINARY(16) через тимчасову колонку"""
+    tmp_column = f'{column}_bin'
+    if _column_type(cursor, table, column) == 'binary':
+        return
+
+    _add_column(cursor, table, tmp_column, 'BINARY(16) NULL')
+    cursor.execute(f'UPDATE {table} SET {tmp_column} = UNHEX({column}) WHERE {tmp_column} IS NULL')
+    cursor.execute(f'''
+        ALTER TABLE {table}
+            DROP COLUMN {column},
+            CHANGE COLUMN {tmp_column} {column} BINARY(16) NOT NULL,
+            ADD UNIQUE KEY {column} ({column})
+    ''')
+    logger.info(f"Converted {table}.{column} to BINARY(16)")
+
+
+def _binary_hashes(cursor):
+    _convert_hash_column(cursor, 'Review_RAW', 'rr_hash')
+    _convert_hash_column(cursor, 'Product_CORE', 'pc_hash')
+    _convert_hash_column(cursor, 'Review_CORE', 'rc_hash')
+
+
+def _review_count_and_source(cursor):
+    """pc_review_count у Product_CORE та джерело відгуку в Review_RAW"""
+    _add_column(cursor, 'Product_CORE', 'pc_review_count', 'INT NOT NULL DEFAULT 0')
+    if _column_type(cursor, 'Review_RAW', 'source_fk_rr') is None:
+        cursor.execute('''
+            ALTER TABLE Review_RAW
+                ADD COLUMN source_fk_rr INT NULL,
+                ADD FOREIGN KEY (source_fk_rr) REFERENCES Sources(source_id)
+        ''')
+        cursor.execute('''
+            UPDATE Review_RAW rr
+            JOIN Product_RAW pr ON rr.pr_fk_rr = pr.pr_id
+            JOIN Extracts e ON pr.extract_fk_pr = e.extract_id
+            SET rr.source_fk_rr = e.extract_fk_source
+        ''')
+        logger.info("Added column Review_RAW.source_fk_rr")
+
+
+def _near_duplicate_tables(cursor):
+    """LSH-індекс відгуків і таблиця майже-дублікатів з посиланням на канонічний відгук"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Review_LSH (
+            pc_fk_rl INT NOT NULL,
+            rl_band TINYINT NOT NULL,
+            rl_key BIGINT NOT NULL,
+            rc_fk_rl INT NOT NULL,
+            PRIMARY KEY (pc_fk_rl, rl_band, rl_key, rc_fk_rl),
+            FOREIGN KEY (rc_fk_rl) REFERENCES Review_CORE(rc_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Review_NEAR_DUP (
+            nd_id INT AUTO_INCREMENT PRIMARY KEY,
+            rc_fk_nd INT NOT NULL,
+            nd_text TEXT NOT NULL,
+            nd_date DATE NOT NULL,
+            nd_source INT NOT NULL,
+            nd_similarity FLOAT NOT NULL,
+            nd_hash BINARY(16) UNIQUE NOT NULL,
+            FOREIGN KEY (rc_fk_nd) REFERENCES Review_CORE(rc_id)
+        )
+    ''')
+
+    # Review_LSH заповнюється NearDuplicateIndex.ensure_params() - ключі залежать від
+    # параметрів MinHash/LSH, які записуються в Review_LSH_PARAMS
+
+
+def _extract_jobs_table(cursor):
+    """Черга задач для розподіленого збору відгуків (src/worker.py)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Extract_JOBS (
+            job_id INT AUTO_INCREMENT PRIMARY KEY,
+            extract_fk_job INT NOT NULL,
+            pr_fk_job INT NOT NULL UNIQUE,
+            job_status ENUM('queued', 'claimed', 'done', 'failed') NOT NULL DEFAULT 'queued',
+            job_worker VARCHAR(255) NULL,
+            job_lease_until DATETIME NULL,
+            job_attempts INT NOT NULL DEFAULT 0,
+            job_error TEXT NULL,
+            INDEX idx_job_status_lease (job_status, job_lease_until),
+            INDEX idx_job_extract_status (extract_fk_job, job_status),
+            FOREIGN KEY (extract_fk_job) REFERENCES Extracts(extract_id),
+            FOREIGN KEY (pr_fk_job) REFERENCES Product_RAW(pr_id)
+        )
+    ''')
+
+
+def _page_archive_table(cursor):
+    """Індекс архіву сирих сторінок (файли - в archive/, src/archive.py)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Page_ARCHIVE (
+            pa_id INT AUTO_INCREMENT PRIMARY KEY,
+            extract_fk_pa INT NOT NULL,
+            pa_url TEXT NOT NULL,
+            pa_kind ENUM('search', 'product') NOT NULL,
+            pa_sha256 BINARY(32) NOT NULL,
+            pa_fetched DATETIME NOT NULL,
+            INDEX idx_pa_extract_kind (extract_fk_pa, pa_kind),
+            INDEX idx_pa_url (pa_url(191)),
+            FOREIGN KEY (extract_fk_pa) REFERENCES Extracts(extract_id)
+        )
+    ''')
+
+
+def _sentiment_backfill(cursor):
+    """Модель, якою оцінено сентимент відгуку, і прогрес backfill'у (src/backfill.py)"""
+    _add_column(cursor, 'Review_CORE', 'rc_sentiment_model', 'VARCHAR(255) NULL')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Backfill_PROGRESS (
+            bp_id INT AUTO_INCREMENT PRIMARY KEY,
+            bp_model VARCHAR(255) NOT NULL,
+            bp_last_rc_id INT NOT NULL DEFAULT 0,
+            bp_scored INT NOT NULL DEFAULT 0,
+            bp_status ENUM('running', 'done') NOT NULL DEFAULT 'running',
+            bp_started DATETIME NOT NULL,
+            bp_updated DATETIME NOT NULL,
+            INDEX idx_bp_model_status (bp_model, bp_status)
+        )
+    ''')
+
+
+def _product_summary_table(cursor):
+    """Агрегати відгуків по продуктах (src/rollup.py) + початкове заповнення з Review_CORE"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Product_SUMMARY (
+            pc_fk_ps INT PRIMARY KEY,
+            ps_review_count INT NOT NULL DEFAULT 0,
+            ps_positive INT NOT NULL DEFAULT 0,
+            ps_neutral INT NOT NULL DEFAULT 0,
+            ps_negative INT NOT NULL DEFAULT 0,
+            ps_unscored INT NOT NULL DEFAULT 0,
+            ps_first_date DATE NULL,
+            ps_last_date DATE NULL,
+            ps_last_source INT NULL,
+            ps_updated DATETIME NOT NULL,
+            INDEX idx_ps_updated (ps_updated),
+            FOREIGN KEY (pc_fk_ps) REFERENCES Product_CORE(pc_id)
+        )
+    ''')
+    # Зафіксована копія rollup.rebuild() на момент цієї міграції
+    cursor.execute('''
+        INSERT IGNORE INTO Product_SUMMARY
+        (pc_fk_ps, ps_review_count, ps_positive, ps_neutral, ps_negative, ps_unscored,
+         ps_first_date, ps_last_date, ps_last_source, ps_updated)
+        SELECT agg.pc_id, agg.review_count, agg.positive, agg.neutral, agg.negative, agg.unscored,
+               agg.first_date, agg.last_date,
+               (SELECT l.rc_source FROM Review_CORE l WHERE l.pc_fk_rc = agg.pc_id
+                ORDER BY l.rc_date DESC, l.rc_id DESC LIMIT 1),
+               %s
+        FROM (
+            SELECT r.pc_fk_rc AS pc_id,
+                   COUNT(*) AS review_count,
+                   SUM(r.rc_sentiment = 'positive') AS positive,
+                   SUM(r.rc_sentiment = 'neutral') AS neutral,
+                   SUM(r.rc_sentiment = 'negative') AS negative,
+                   SUM(r.rc_sentiment IS NULL) AS unscored,
+                   MIN(r.rc_date) AS first_date,
+                   MAX(r.rc_date) AS last_date
+            FROM Review_CORE r
+            GROUP BY r.pc_fk_rc
+        ) agg
+    ''', (datetime.now(),))
+
+
+def _lsh_params_table(cursor):
+    """Параметри, з якими побудовано Review_LSH (заповнює NearDuplicateIndex.ensure_params)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Review_LSH_PARAMS (
+            lp_id TINYINT PRIMARY KEY,
+            lp_params VARCHAR(255) NOT NULL,
+            lp_updated DATETIME NOT NULL
+        )
+    ''')
+
+
+def _replay_extracts(cursor):
+    """Посилання replay-extract'у на оригінальний extract (src/replay.py)"""
+    if _column_type(cursor, 'Extracts', 'extract_replay_of') is None:
+        cursor.execute('''
+            ALTER TABLE Extracts
+                ADD COLUMN extract_replay_of INT NULL,
+                ADD FOREIGN KEY (extract_replay_of) REFERENCES Extracts(extract_id)
+        ''')
+        logger.info("Added column Extracts.extract_replay_of")
+
+
+MIGRATIONS = [
+    (1, 'baseline schema', _baseline),
+    (2, 'indexes for pipeline queries', _add_pipeline_indexes),
+    (3, 'BINARY(16) hash columns', _binary_hashes),
+    (4, 'pc_review_count and Review_RAW source', _review_count_and_source),
+    (5, 'near-duplicate review index', _near_duplicate_tables),
+    (6, 'distributed extract job queue', _extract_jobs_table),
+    (7, 'raw page archive index', _page_archive_table),
+    (8, 'sentiment model and backfill progress', _sentiment_backfill),
+    (9, 'product review rollups', _product_summary_table),
+    (10, 'near-duplicate index parameters', _lsh_params_table),
+    (11, 'replay extracts', _replay_extracts),
+]
+
+
+def migrate(conn):
+    """Застосовує всі відсутні міграції. Повертає список застосованих версій"""
+    cursor = conn.cursor()
+    # Кілька процесів можуть стартувати одночасно - міграції виконує лише один
+    cursor.execute('SELECT GET_LOCK(%s, 60)', (MIGRATION_LOCK,))
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError("Could not acquire schema migration lock")
+
+    try:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Schema_VERSION (
+                sv_version INT PRIMARY KEY,
+                sv_desc VARCHAR(255) NOT NULL,
+                sv_applied DATETIME NOT NULL
+            )
+        ''')
+        cursor.execute('SELECT sv_version FROM Schema_VERSION')
+        applied = {row[0] for row in cursor.fetchall()}
+
+        newly_applied = []
+        for version, desc, step in MIGRATIONS:
+            if version in applied:
+                continue
+            logger.info(f"Applying migration {version}: {desc}")
+            step(cursor)
+            cursor.execute('''
+                INSERT INTO Schema_VERSION (sv_version, sv_desc, sv_applied)
+                VALUES (%s, %s, %s)
+            ''', (version, desc, datetime.now()))
+            conn.commit()
+            newly_applied.append(version)
+
+        return newly_applied
+    finally:
+        cursor.execute('SELECT RELEASE_LOCK(%s)', (MIGRATION_LOCK,))
+        cursor.fetchone()
+
+
+def check(conn):
+    """Виконує EXPLAIN для запитів pipeline. Повертає список (назва, таблиця) з full scan"""
+    cursor = conn.cursor(dictionary=True)
+    full_scans = []
+    for name, query, params in queries.PIPELINE_QUERIES:
+        cursor.execute('EXPLAIN ' + query, params)
+        for row in cursor.fetchall():
+            if (row.get('type') or '').upper() == 'ALL':
+                full_scans.append((name, row.get('table')))
+                logger.warning(f"Full scan in '{name}' on table {row.get('table')} "
+                               f"(possible_keys={row.get('possible_keys')})")
+        logger.info(f"Checked query plan: {name}")
+    return full_scans
+
+
+def _connect(config_path='config/api_keys.yaml'):
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    return mysql.connector.connect(
+        host=config['mysql']['host'],
+        user=config['mysql']['user'],
+        password=config['mysql']['password'],
+        database=config['mysql']['database'],
+        charset='utf8mb4'
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    command = sys.argv[1] if len(sys.argv) > 1 else 'migrate'
+
+    conn = _connect()
+    try:
+        if command == 'migrate':
+            versions = migrate(conn)
+            logger.info(f"Applied migrations: {versions or 'none'}")
+        elif command == 'check':
+            migrate(conn)
+            scans = check(conn)
+            sys.exit(1 if scans else 0)
+        else:
+            print(f"Unknown command: {command}. Use 'migrate' or 'check'")
+            sys.exit(2)
+    finally:
+        conn.close()
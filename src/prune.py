@@ -0,0 +1,86 @@
+"""
+Обрізання HTML перед відправкою в Parsera/LLM.
+
+Сторінка пошуку чи товару - це десятки тисяч токенів меню, футерів, скриптів і
+трекінгу навколо десятка карток. Тут прибирається службова розмітка і, якщо
+вдається, залишається лише блок з повторюваними елементами (картки товарів,
+відгуки), тож LLM читає на порядок менше тексту.
+"""
+
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+BOILERPLATE_TAGS = ['script', 'style', 'noscript', 'svg', 'iframe', 'template', 'link', 'meta',
+                    'nav', 'form', 'button', 'select', 'input', 'picture', 'source', 'video', 'canvas']
+# header/footer прибираються лише на рівні сторінки, а не всередині карток
+PAGE_CHROME_TAGS = ['header', 'footer', 'aside']
+KEEP_ATTRS = {'href', 'datetime'}
+
+MIN_REPEATS = 3
+MIN_REGION_TEXT = 200
+
+
+def estimate_tokens(text):
+    """Груба оцінка кількості токенів (~4 символи на токен)"""
+    return len(text or '') // 4
+
+
+def _signature(tag):
+    classes = tag.get('class') or []
+    return tag.name, classes[0] if classes else ''
+
+
+def find_repeated_region(root):
+    """Шукає елемент, діти якого - найбільша група однотипних блоків з текстом.
+
+    Однотипність визначається за тегом і першим класом. Повертає None, якщо
+    групи з принаймні MIN_REPEATS елементів немає.
+    """
+    best = None
+    best_score = 0
+    for node in root.find_all(True):
+        children = node.find_all(True, recursive=False)
+        if len(children) < MIN_REPEATS:
+            continue
+        signature, count = Counter(_signature(child) for child in children).most_common(1)[0]
+        if count < MIN_REPEATS:
+            continue
+        text_len = sum(len(child.get_text(strip=True)) for child in children
+                       if _signature(child) == signature)
+        if text_len < MIN_REGION_TEXT:
+            continue
+        # Більше повторів і більше тексту в них - кращий кандидат
+        score = count * text_len
+        if score > best_score:
+            best, best_score = node, score
+    return best
+
+
+def prune_html(html, isolate_region=True):
+    """Повертає обрізаний HTML: без службових тегів, коментарів і зайвих атрибутів"""
+    from bs4 import BeautifulSoup, Comment
+
+    soup = BeautifulSoup(html, 'html.parser')
+
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+    for tag in soup(PAGE_CHROME_TAGS):
+        if not tag.find_parent(['article', 'li']):
+            tag.decompose()
+
+    root = soup.body or soup
+    if isolate_region:
+        region = find_repeated_region(root)
+        if region is not None:
+            root = region
+
+    for tag in root.find_all(True):
+        tag.attrs = {key: value for key, value in tag.attrs.items() if key in KEEP_ATTRS}
+    if hasattr(root, 'attrs'):
+        root.attrs = {key: value for key, value in root.attrs.items() if key in KEEP_ATTRS}
+
+    return str(root)
@@ -0,0 +1,148 @@
+"""
+Гарячі SQL-запити pipeline.
+
+Кожен запит визначений тут один раз: його виконує код pipeline, а
+`python src/migrations.py check` запускає EXPLAIN для тих самих рядків
+(PIPELINE_QUERIES), тож перевірка планів не розходиться з реальними запитами.
+Запити зі списками змінної довжини мають {placeholders}/{conditions} -
+підставляються через placeholders().
+"""
+
+
+def placeholders(count):
+    return ', '.join(['%s'] * count)
+
+
+# --- Extract ---
+
+SOURCE_ID = 'SELECT source_id FROM Sources WHERE source_desc = %s'
+
+EXTRACT_PRODUCTS = 'SELECT pr_id, pr_url_full FROM Product_RAW WHERE extract_fk_pr = %s'
+
+CLEANUP_REVIEWS = '''
+    DELETE FROM Review_RAW
+    WHERE pr_fk_rr IN (SELECT pr_id FROM Product_RAW WHERE extract_fk_pr = %s)
+'''
+
+# --- Transform ---
+
+SUCCESSFUL_EXTRACTS = "SELECT extract_id FROM Extracts WHERE extract_status = 'success'"
+
+TRANSFORM_PRODUCTS = '''
+    SELECT pr.*, e.extract_fk_source
+    FROM Product_RAW pr
+    JOIN Extracts e ON pr.extract_fk_pr = e.extract_id
+    WHERE pr.extract_fk_pr = %s
+'''
+
+PRODUCT_RAW_REVIEWS = 'SELECT * FROM Review_RAW WHERE pr_fk_rr = %s'
+
+PRODUCT_IDS_BY_HASH = 'SELECT pc_id, pc_hash FROM Product_CORE WHERE pc_hash IN ({placeholders})'
+
+CHUNK_PRODUCTS = '''
+    SELECT pr_id, pr_name, pr_review_count FROM Product_RAW
+    WHERE extract_fk_pr = %s AND pr_id > %s
+    ORDER BY pr_id
+    LIMIT %s
+'''
+
+CHUNK_REVIEWS = '''
+    SELECT rr.rr_id, rr.rr_text, rr.rr_date, rr.rr_hash,
+           pr.pr_name, e.extract_fk_source
+    FROM Review_RAW rr
+    JOIN Product_RAW pr ON rr.pr_fk_rr = pr.pr_id
+    JOIN Extracts e ON pr.extract_fk_pr = e.extract_id
+    WHERE pr.extract_fk_pr = %s AND rr.rr_id > %s
+    ORDER BY rr.rr_id
+    LIMIT %s
+'''
+
+EXISTING_REVIEW_HASHES = '''
+    SELECT rc_hash AS review_hash FROM Review_CORE WHERE rc_hash IN ({placeholders})
+    UNION ALL
+    SELECT nd_hash FROM Review_NEAR_DUP WHERE nd_hash IN ({placeholders})
+'''
+
+LSH_CANDIDATES = '''
+    SELECT DISTINCT rc_fk_rl FROM Review_LSH
+    WHERE pc_fk_rl = %s AND ({conditions})
+'''
+LSH_BAND_CONDITION = '(rl_band = %s AND rl_key = %s)'
+
+BACKFILL_BATCH = '''
+    SELECT rc_id, pc_fk_rc, rc_sentiment, rc_text FROM Review_CORE
+    WHERE rc_id > %s AND (rc_sentiment_model IS NULL OR rc_sentiment_model <> %s)
+    ORDER BY rc_id LIMIT %s
+'''
+
+# --- Розподілена черга (src/worker.py) ---
+
+CLAIM_JOB = '''
+    SELECT j.job_id, j.extract_fk_job, j.pr_fk_job, j.job_attempts,
+           pr.pr_url_full, e.extract_fk_source
+    FROM Extract_JOBS j
+    JOIN Product_RAW pr ON j.pr_fk_job = pr.pr_id
+    JOIN Extracts e ON j.extract_fk_job = e.extract_id
+    WHERE (j.job_status = 'queued'
+           OR (j.job_status = 'claimed' AND j.job_lease_until < NOW()))
+      {extract_filter}
+    ORDER BY j.job_id
+    LIMIT 1
+    FOR UPDATE OF j SKIP LOCKED
+'''
+CLAIM_JOB_EXTRACT_FILTER = 'AND j.extract_fk_job = %s'
+
+EXTRACT_JOB_COUNTS = '''
+    SELECT SUM(job_status IN ('queued', 'claimed')) AS open_jobs,
+           SUM(job_status = 'failed') AS failed_jobs
+    FROM Extract_JOBS WHERE extract_fk_job = %s
+'''
+
+# --- Архів сторінок (src/archive.py) ---
+
+ARCHIVED_PAGES = '''
+    SELECT pa.pa_url, pa.pa_sha256, pa.pa_fetched
+    FROM Page_ARCHIVE pa
+    JOIN (
+        SELECT MAX(pa_id) AS pa_id FROM Page_ARCHIVE
+        WHERE extract_fk_pa = %s AND pa_kind = %s
+        GROUP BY pa_url
+    ) latest ON pa.pa_id = latest.pa_id
+    ORDER BY pa.pa_id
+'''
+
+# --- Дашборди (Power BI) ---
+
+PRODUCT_REVIEWS_BY_DATE = 'SELECT rc_id, rc_date FROM Review_CORE WHERE pc_fk_rc = %s ORDER BY rc_date DESC'
+
+PRODUCT_SUMMARY = 'SELECT * FROM Product_SUMMARY WHERE pc_fk_ps = %s'
+
+CHANGED_PRODUCTS = 'SELECT pc_fk_ps FROM Product_SUMMARY WHERE ps_updated >= %s'
+
+
+_HASH = b'\x00' * 16
+
+# (назва, запит, приклад параметрів) для EXPLAIN. Параметри - будь-які значення
+# відповідного типу, EXPLAIN дивиться лише на план.
+PIPELINE_QUERIES = [
+    ('source lookup', SOURCE_ID, ('makeup.com.ua',)),
+    ('successful extracts', SUCCESSFUL_EXTRACTS, ()),
+    ('extract products', EXTRACT_PRODUCTS, (1,)),
+    ('transform products', TRANSFORM_PRODUCTS, (1,)),
+    ('product reviews', PRODUCT_RAW_REVIEWS, (1,)),
+    ('product lookup by hash', PRODUCT_IDS_BY_HASH.format(placeholders=placeholders(2)),
+     (_HASH, b'\x01' * 16)),
+    ('chunked products', CHUNK_PRODUCTS, (1, 0, 500)),
+    ('chunked reviews', CHUNK_REVIEWS, (1, 0, 500)),
+    ('existing review hashes', EXISTING_REVIEW_HASHES.format(placeholders=placeholders(1)), (_HASH, _HASH)),
+    ('near-duplicate candidates',
+     LSH_CANDIDATES.format(conditions=' OR '.join([LSH_BAND_CONDITION] * 2)), (1, 0, 1, 1, 1)),
+    ('backfill batch', BACKFILL_BATCH, (0, 'model', 200)),
+    ('claimable jobs', CLAIM_JOB.format(extract_filter=CLAIM_JOB_EXTRACT_FILTER), (1,)),
+    ('open jobs per extract', EXTRACT_JOB_COUNTS, (1,)),
+    ('archived pages of extract', ARCHIVED_PAGES, (1, 'product')),
+    ('cleanup reviews', CLEANUP_REVIEWS, (1,)),
+    ('product reviews by date', PRODUCT_REVIEWS_BY_DATE, (1,)),
+    ('product summary', PRODUCT_SUMMARY, (1,)),
+    ('recently changed products', CHANGED_PRODUCTS, ('2024-01-01',)),
+]
@@ -0,0 +1,105 @@
+"""
+Офлайн-перепарсинг з архіву сторінок (режим `python run_retl.py replay`).
+
+Для кожного extract'у з архівованими сторінками товарів створюється новий
+extract того ж джерела: продукти копіюються з оригінального Product_RAW, а
+відгуки заново парсяться з архівного HTML, нормалізуються і хешуються тим
+самим кодом, що й при скрапінгу. Мережа не використовується, тому покращені
+селектори можна застосувати до всієї історії за хвилини. Відгуки з тим самим
+rr_hash ігноруються (INSERT IGNORE), тож у RAW додаються лише змінені.
+
+Новий extract позначається extract_replay_of: його extract_datetime - час replay,
+а не скрапінгу, тому планувальник не бере такі extract'и в історію продуктів.
+"""
+
+import logging
+
+from extract import Extractor
+from log_setup import log_context
+
+logger = logging.getLogger(__name__)
+
+
+class Replayer:
+    def __init__(self, config_path='config/api_keys.yaml'):
+        self.extractor = Extractor(config_path)
+        if self.extractor.archive is None:
+            raise RuntimeError("Page archive is disabled (archive.enabled: false)")
+
+    @property
+    def conn(self):
+        return self.extractor.conn
+
+    def archived_extracts(self, since_extract_id=None):
+        """ID extract'ів, для яких є архівовані сторінки товарів"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT DISTINCT extract_fk_pa FROM Page_ARCHIVE
+            WHERE pa_kind = 'product' AND extract_fk_pa >= %s
+            ORDER BY extract_fk_pa
+        ''', (since_extract_id or 0,))
+        return [row[0] for row in cursor.fetchall()]
+
+    def replay_extract(self, extract_id):
+        """Перепарсює архів одного extract'у в новий extract. Повертає ID нового extract'у"""
+        cursor = self.conn.cursor(dictionary=True)
+        cursor.execute('''
+            SELECT s.source_desc FROM Extracts e
+            JOIN Sources s ON e.extract_fk_source = s.source_id
+            WHERE e.extract_id = %s
+        ''', (extract_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise ValueError(f"Extract {extract_id} does not exist")
+        source_desc = row['source_desc']
+
+        cursor.execute('''
+            SELECT pr_name, pr_review_count, pr_url_full FROM Product_RAW WHERE extract_fk_pr = %s
+        ''', (extract_id,))
+        products = {row['pr_url_full']: row for row in cursor.fetchall()}
+        pages = self.extractor.archive.pages(self.conn, extract_id, 'product')
+        if not products:
+            logger.warning(f"Extract {extract_id} has no products in RAW, nothing to replay")
+            return None
+
+        new_extract_id = self.extractor.create_extract_entry(source_desc, replay_of=extract_id)
+        total_reviews = 0
+        try:
+            for url, sha256_hex, fetched in pages:
+                product = products.get(url)
+                if product is None:
+                    continue
+                html = self.extractor.archive.load(sha256_hex)
+                pr_id = self.extractor.save_product(product['pr_name'], url, product['pr_review_count'])
+                with log_context(product_id=pr_id):
+                    reviews = self.extractor._fetch_reviews_via_http(url, html=html)
+                    # Відносні дати ("вчора") - від часу завантаження сторінки, а не від зараз
+                    total_reviews += self.extractor.save_reviews(pr_id, reviews, fetched_at=fetched)
+            self.extractor.update_extract_status('success')
+        except Exception as e:
+            logger.error(f"Replay of extract {extract_id} failed: {e}")
+            self.extractor.cleanup()
+            self.extractor.update_extract_status('failed')
+            raise
+
+        logger.info(f"Replayed extract {extract_id} -> {new_extract_id}: "
+                    f"{len(pages)} pages, {total_reviews} new reviews")
+        return new_extract_id
+
+    def run(self, extract_ids=None, since_extract_id=None):
+        """Перепарсює задані extract'и (або всі з архівом). Повертає ID нових extract'ів"""
+        self.extractor._connect_db()
+        replayed = []
+        try:
+            for extract_id in extract_ids or self.archived_extracts(since_extract_id):
+                with log_context(extract_id=extract_id):
+                    try:
+                        new_extract_id = self.replay_extract(extract_id)
+                    except Exception as e:
+                        logger.error(f"Replay of extract {extract_id} failed: {e}", exc_info=True)
+                        continue
+                    if new_extract_id:
+                        replayed.append(new_extract_id)
+        finally:
+            self.conn.close()
+        return replayed
@@ -0,0 +1,160 @@
+"""
+Агрегати відгуків по продуктах (Product_SUMMARY).
+
+Кількість відгуків, розподіл сентименту, перша/остання rc_date і джерело
+останнього відгуку зберігаються по рядку на продукт і оновлюються інкрементно
+в тій самій транзакції, що й вставка відгуків у Review_CORE (Transformer) чи
+зміна сентименту (backfill). Дашборди і запити "які продукти змінились"
+читають O(продуктів) рядків замість агрегування всього Review_CORE.
+
+Майже-дублікати (Review_NEAR_DUP) не рахуються - лише рядки Review_CORE.
+verify() порівнює агрегати з Review_CORE, rebuild() перераховує їх заново
+(режим `python run_retl.py rollups`).
+"""
+
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Колонка лічильника для кожного значення rc_sentiment (None - ще не оцінений)
+SENTIMENT_COLUMNS = {
+    'positive': 'ps_positive',
+    'neutral': 'ps_neutral',
+    'negative': 'ps_negative',
+    None: 'ps_unscored',
+}
+
+_AGGREGATE_SELECT = '''
+    SELECT r.pc_fk_rc AS pc_id,
+           COUNT(*) AS review_count,
+           SUM(r.rc_sentiment = 'positive') AS positive,
+           SUM(r.rc_sentiment = 'neutral') AS neutral,
+           SUM(r.rc_sentiment = 'negative') AS negative,
+           SUM(r.rc_sentiment IS NULL) AS unscored,
+           MIN(r.rc_date) AS first_date,
+           MAX(r.rc_date) AS last_date
+    FROM Review_CORE r
+'''
+
+
+def add_reviews(cursor, reviews):
+    """Додає нові відгуки до агрегатів (коміт робить викликач).
+
+    reviews - список dict(pc_id, sentiment, date, source) вставлених у Review_CORE рядків.
+    """
+    products = {}
+    for review in reviews:
+        summary = products.setdefault(review['pc_id'], {
+            'count': 0, 'first_date': review['date'], 'last_date': review['date'],
+            'last_source': review['source'], **{column: 0 for column in SENTIMENT_COLUMNS.values()},
+        })
+        summary['count'] += 1
+        summary[SENTIMENT_COLUMNS[review['sentiment']]] += 1
+        summary['first_date'] = min(summary['first_date'], review['date'])
+        if review['date'] >= summary['last_date']:
+            summary['last_date'] = review['date']
+            summary['last_source'] = review['source']
+    if not products:
+        return
+
+    now = datetime.now()
+    # ps_last_source оновлюється перед ps_last_date: MySQL застосовує присвоєння зліва направо
+    cursor.executemany('''
+        INSERT INTO Product_SUMMARY
+        (pc_fk_ps, ps_review_count, ps_positive, ps_neutral, ps_negative, ps_unscored,
+         ps_first_date, ps_last_date, ps_last_source, ps_updated)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            ps_review_count = ps_review_count + VALUES(ps_review_count),
+            ps_positive = ps_positive + VALUES(ps_positive),
+            ps_neutral = ps_neutral + VALUES(ps_neutral),
+            ps_negative = ps_negative + VALUES(ps_negative),
+            ps_unscored = ps_unscored + VALUES(ps_unscored),
+            ps_first_date = LEAST(ps_first_date, VALUES(ps_first_date)),
+            ps_last_source = IF(VALUES(ps_last_date) >= ps_last_date, VALUES(ps_last_source), ps_last_source),
+            ps_last_date = GREATEST(ps_last_date, VALUES(ps_last_date)),
+            ps_updated = VALUES(ps_updated)
+    ''', [(pc_id, summary['count'], summary['ps_positive'], summary['ps_neutral'],
+           summary['ps_negative'], summary['ps_unscored'], summary['first_date'],
+           summary['last_date'], summary['last_source'], now)
+          for pc_id, summary in products.items()])
+
+
+def change_sentiments(cursor, changes):
+    """Переносить відгуки між лічильниками сентименту (коміт робить викликач).
+
+    changes - список (pc_id, старий сентимент, новий сентимент).
+    """
+    deltas = {}
+    for pc_id, old, new in changes:
+        if old == new:
+            continue
+        product = deltas.setdefault(pc_id, dict.fromkeys(SENTIMENT_COLUMNS.values(), 0))
+        product[SENTIMENT_COLUMNS[old]] -= 1
+        product[SENTIMENT_COLUMNS[new]] += 1
+    if not deltas:
+        return
+
+    cursor.executemany('''
+        UPDATE Product_SUMMARY
+        SET ps_positive = ps_positive + %s, ps_neutral = ps_neutral + %s,
+            ps_negative = ps_negative + %s, ps_unscored = ps_unscored + %s, ps_updated = %s
+        WHERE pc_fk_ps = %s
+    ''', [(delta['ps_positive'], delta['ps_neutral'], delta['ps_negative'], delta['ps_unscored'],
+           datetime.now(), pc_id) for pc_id, delta in deltas.items()])
+
+
+def verify(cursor):
+    """Повертає pc_id продуктів, агрегати яких не збігаються з Review_CORE.
+
+    Джерело останнього відгуку не перевіряється: при кількох відгуках з тією самою
+    датою інкрементне оновлення і rebuild можуть обрати різні, однаково вірні джерела.
+    """
+    cursor.execute(f'''
+        SELECT agg.pc_id
+        FROM ({_AGGREGATE_SELECT} GROUP BY r.pc_fk_rc) agg
+        LEFT JOIN Product_SUMMARY ps ON ps.pc_fk_ps = agg.pc_id
+        WHERE ps.pc_fk_ps IS NULL
+           OR ps.ps_review_count <> agg.review_count
+           OR ps.ps_positive <> agg.positive
+           OR ps.ps_neutral <> agg.neutral
+           OR ps.ps_negative <> agg.negative
+           OR ps.ps_unscored <> agg.unscored
+           OR NOT (ps.ps_first_date <=> agg.first_date)
+           OR NOT (ps.ps_last_date <=> agg.last_date)
+        UNION
+        SELECT ps.pc_fk_ps FROM Product_SUMMARY ps
+        WHERE NOT EXISTS (SELECT 1 FROM Review_CORE r WHERE r.pc_fk_rc = ps.pc_fk_ps)
+    ''')
+    return [row[0] for row in cursor.fetchall()]
+
+
+def rebuild(cursor, pc_ids=None):
+    """Перераховує агрегати з Review_CORE: для pc_ids або (None) для всіх продуктів.
+    Коміт робить викликач. Повертає кількість записаних рядків"""
+    if pc_ids is not None and not pc_ids:
+        return 0
+    where = ''
+    params = ()
+    if pc_ids is not None:
+        placeholders = ', '.join(['%s'] * len(pc_ids))
+        where = f'WHERE r.pc_fk_rc IN ({placeholders})'
+        params = tuple(pc_ids)
+        cursor.execute(f'DELETE FROM Product_SUMMARY WHERE pc_fk_ps IN ({placeholders})', params)
+    else:
+        cursor.execute('DELETE FROM Product_SUMMARY')
+
+    cursor.execute(f'''
+        INSERT INTO Product_SUMMARY
+        (pc_fk_ps, ps_review_count, ps_positive, ps_neutral, ps_negative, ps_unscored,
+         ps_first_date, ps_last_date, ps_last_source, ps_updated)
+        SELECT agg.pc_id, agg.review_count, agg.positive, agg.neutral, agg.negative, agg.unscored,
+               agg.first_date, agg.last_date,
+               (SELECT l.rc_source FROM Review_CORE l WHERE l.pc_fk_rc = agg.pc_id
+                ORDER BY l.rc_date DESC, l.rc_id DESC LIMIT 1),
+               %s
+        FROM ({_AGGREGATE_SELECT} {where} GROUP BY r.pc_fk_rc) agg
+    ''', (datetime.now(),) + params)
+    logger.info(f"Rebuilt {cursor.rowcount} product summaries")
+    return cursor.rowcount
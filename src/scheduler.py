@@ -0,0 +1,338 @@
+"""
+Адаптивний планувальник повторного скрапінгу (режим `python run_retl.py schedule`).
+
+Замість щотижневого проходу по всіх продуктах планувальник тримає чергу з
+пріоритетом: продукт, на якому відгуки з'являються часто, перевіряється
+частіше, "сплячий" - рідше. Швидкість (відгуків/день) оцінюється з історії
+pr_review_count у Product_RAW і з дат відгуків Review_RAW.rr_date, а після
+кожного повторного скрапінгу уточнюється за кількістю нових відгуків.
+
+Запити до кожного джерела обмежені бюджетом (token bucket, requests_per_hour):
+повторний скрапінг списує HTTP-запит і, якщо знадобився, фолбек на Parsera.
+Сторінки пошуку (по запиту на сторінку) періодично перевіряються, щоб знайти нові продукти
+і продукти, у яких зросла кількість відгуків - вони стають в чергу одразу.
+
+Повторно зібрані продукти пишуться в RAW пачками: один extract на batch_size
+продуктів джерела, після закриття extract'у він одразу трансформується в CORE.
+Сторінки пошуку discovery архівуються під extract відкритої пачки джерела.
+"""
+
+import time
+import heapq
+import logging
+import itertools
+from datetime import datetime, timedelta
+
+import mysql.connector
+import yaml
+
+from extract import Extractor
+from transform import Transformer
+from log_setup import log_context
+
+logger = logging.getLogger(__name__)
+
+# Запитів на повторний скрапінг продукту: HTTP + можливий фолбек на Parsera
+REFETCH_REQUESTS = 2
+
+
+class TokenBucket:
+    """Бюджет запитів до джерела: capacity запитів, поповнення rate запитів/секунду"""
+
+    def __init__(self, per_hour):
+        self.capacity = max(1.0, float(per_hour))
+        self.rate = self.capacity / 3600.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_consume(self, amount=1):
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def seconds_until_available(self, amount=1):
+        self._refill()
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+
+class RecrawlScheduler:
+    def __init__(self, config_path='config/api_keys.yaml'):
+        self.config_path = config_path
+        self.config = self._load_config(config_path)
+
+        sched_conf = self.config.get('scheduler', {})
+        self.min_interval = timedelta(hours=sched_conf.get('min_interval_hours', 6))
+        self.max_interval = timedelta(days=sched_conf.get('max_interval_days', 14))
+        # Повторний скрапінг, коли очікується стільки нових відгуків
+        self.target_new_reviews = sched_conf.get('target_new_reviews', 1)
+        self.velocity_window_days = sched_conf.get('velocity_window_days', 90)
+        self.discovery_interval = timedelta(hours=sched_conf.get('discovery_interval_hours', 24))
+        self.batch_size = sched_conf.get('batch_size', 20)
+        self.poll_seconds = sched_conf.get('poll_seconds', 60)
+        default_budget = sched_conf.get('requests_per_hour', 60)
+
+        self.sources = {source['name']: source for source in self.config.get('sources', [])}
+        self.budgets = {name: TokenBucket(source.get('requests_per_hour', default_budget))
+                        for name, source in self.sources.items()}
+
+        self.transformer = Transformer(config_path)
+        self.products = {}   # (source_name, url) -> стан продукту
+        self.queue = []      # heap (due, -velocity, seq, key)
+        self._seq = itertools.count()
+        self.batches = {}    # source_name -> {'extractor', 'count'}
+        self.next_discovery = datetime.now()
+
+    def _load_config(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+
+    def _connect_db(self):
+        return mysql.connector.connect(
+            host=self.config['mysql']['host'],
+            user=self.config['mysql']['user'],
+            password=self.config['mysql']['password'],
+            database=self.config['mysql']['database'],
+            charset='utf8mb4'
+        )
+
+    # --- Пріоритети ---
+
+    def _interval(self, velocity):
+        """Через скільки повертатись до продукту з даною швидкістю (відгуків/день)"""
+        if velocity <= 0:
+            return self.max_interval
+        interval = timedelta(days=self.target_new_reviews / velocity)
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def _schedule(self, key, due=None):
+        product = self.products[key]
+        if due is None:
+            due = product['last_fetched'] + self._interval(product['velocity'])
+        product['due'] = due
+        heapq.heappush(self.queue, (due, -product['velocity'], next(self._seq), key))
+
+    def load_products(self):
+        """Будує чергу з історії RAW: останній скрапінг і швидкість появи відгуків"""
+        conn = self._connect_db()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            # Replay-extract'и не скрапили сайт: їх extract_datetime - час перепарсингу
+            cursor.execute('''
+                SELECT s.source_desc, pr.pr_url_full,
+                       MAX(pr.pr_name) AS pr_name,
+                       MIN(e.extract_datetime) AS first_seen,
+                       MAX(e.extract_datetime) AS last_fetched,
+                       MIN(pr.pr_review_count) AS min_count,
+                       MAX(pr.pr_review_count) AS max_count
+                FROM Product_RAW pr
+                JOIN Extracts e ON pr.extract_fk_pr = e.extract_id
+                JOIN Sources s ON e.extract_fk_source = s.source_id
+                WHERE e.extract_status = 'success'
+                  AND e.extract_replay_of IS NULL
+                GROUP BY s.source_desc, pr.pr_url_full
+            ''')
+            history = cursor.fetchall()
+
+            window_start = datetime.now() - timedelta(days=self.velocity_window_days)
+            cursor.execute('''
+                SELECT pr.pr_url_full, COUNT(DISTINCT rr.rr_id) AS recent_reviews
+                FROM Review_RAW rr
+                JOIN Product_RAW pr ON rr.pr_fk_rr = pr.pr_id
+                WHERE rr.rr_date >= %s
+                GROUP BY pr.pr_url_full
+            ''', (window_start.date(),))
+            recent = {row['pr_url_full']: row['recent_reviews'] for row in cursor.fetchall()}
+        finally:
+            conn.close()
+
+        self.products = {}
+        self.queue = []
+        for row in history:
+            if row['source_desc'] not in self.sources:
+                continue
+            observed_days = max(1.0, (row['last_fetched'] - row['first_seen']).total_seconds() / 86400)
+            count_velocity = (row['max_count'] - row['min_count']) / observed_days
+            date_velocity = recent.get(row['pr_url_full'], 0) / self.velocity_window_days
+
+            key = (row['source_desc'], row['pr_url_full'])
+            self.products[key] = {
+                'source': row['source_desc'],
+                'url': row['pr_url_full'],
+                'name': row['pr_name'],
+                'review_count': row['max_count'],
+                'last_fetched': row['last_fetched'],
+                'velocity': max(count_velocity, date_velocity),
+            }
+            self._schedule(key)
+
+        logger.info(f"Scheduler loaded {len(self.products)} products")
+
+    # --- Пошук нових / змінених продуктів ---
+
+    def discover(self, source_name):
+        """Перевіряє сторінку пошуку: нові продукти і продукти з новими відгуками йдуть у чергу одразу"""
+        source = self.sources[source_name]
+        # Через extractor відкритої пачки: сторінки пошуку архівуються під її extract
+        extractor = self._batch(source_name)['extractor']
+        # Кожна сторінка пошуку (і фолбек на Parsera) списується з бюджету джерела
+        products = extractor.fetch_products(source['url'], budget=self.budgets[source_name])
+
+        now = datetime.now()
+        queued = 0
+        for product in products:
+            if (product['product_reviews_count'] or 0) < 1 or not extractor.is_valid_product(product['product_name']):
+                continue
+            key = (source_name, source['domain'] + product['product_url'])
+            known = self.products.get(key)
+            if known is None:
+                self.products[key] = {
+                    'source': source_name,
+                    'url': key[1],
+                    'name': product['product_name'],
+                    'review_count': product['product_reviews_count'],
+                    'last_fetched': now,
+                    'velocity': 0.0,
+                    'new': True,
+                }
+                self._schedule(key, due=now)
+                queued += 1
+            elif product['product_reviews_count'] > known['review_count']:
+                known['listing_count'] = product['product_reviews_count']
+                self._schedule(key, due=now)
+                queued += 1
+        logger.info(f"Discovery on {source_name}: {len(products)} listed, {queued} queued now")
+
+    # --- Пачки RAW ---
+
+    def _batch(self, source_name):
+        """Відкритий extract для джерела (створюється за потреби)"""
+        batch = self.batches.get(source_name)
+        if batch is None:
+            extractor = Extractor(self.config_path)
+            extractor._connect_db()
+            extractor.create_extract_entry(source_name)
+            batch = {'extractor': extractor, 'count': 0}
+            self.batches[source_name] = batch
+        return batch
+
+    def _close_batch(self, source_name):
+        batch = self.batches.pop(source_name, None)
+        if batch is None:
+            return
+        extractor = batch['extractor']
+        try:
+            if batch['count'] == 0:
+                # Продуктів немає (лише сторінки пошуку discovery - вони лишаються в архіві)
+                extractor.cleanup()
+                extractor.update_extract_status('failed')
+                return
+            extractor.update_extract_status('success')
+        finally:
+            extractor.conn.close()
+
+        extract_id = extractor.current_extract_id
+        with log_context(extract_id=extract_id):
+            logger.info(f"Closed scheduler extract {extract_id} for {source_name}: {batch['count']} products")
+            if self.transformer.chunked:
+                self.transformer.transform_extract_chunked(extract_id)
+            else:
+                self.transformer.transform_extract(extract_id)
+
+    def close_all_batches(self):
+        for source_name in list(self.batches):
+            try:
+                self._close_batch(source_name)
+            except Exception as e:
+                logger.error(f"Failed to close scheduler batch for {source_name}: {e}")
+
+    # --- Повторний скрапінг ---
+
+    def refetch(self, key):
+        product = self.products[key]
+        batch = self._batch(product['source'])
+        extractor = batch['extractor']
+        now = datetime.now()
+
+        reviews = extractor.fetch_reviews_from_parsera(product['url'], budget=self.budgets[product['source']])
+        # pr_review_count - кількість відгуків за даними магазину (як і в run_extraction):
+        # остання відома з листингу, а не кількість відгуків, зібраних зі сторінки
+        review_count = max(product['review_count'], product.pop('listing_count', 0))
+        pr_id = extractor.save_product(product['name'], product['url'], review_count)
+        with log_context(product_id=pr_id):
+            saved = extractor.save_reviews(pr_id, reviews)
+            logger.info("Refetched %s: %s new reviews", product['url'], saved)
+
+        # Уточнити швидкість: згладжене середнє між попередньою оцінкою і щойно спостереженою.
+        # Для нового продукту всі відгуки "нові", тому перший скрапінг швидкість не змінює
+        if not product.pop('new', False):
+            elapsed_days = max(1 / 24, (now - product['last_fetched']).total_seconds() / 86400)
+            product['velocity'] = 0.5 * product['velocity'] + 0.5 * (saved / elapsed_days)
+        product['review_count'] = review_count
+        product['last_fetched'] = now
+
+        batch['count'] += 1
+        if batch['count'] >= self.batch_size:
+            self._close_batch(product['source'])
+
+    def run_forever(self):
+        """Основний цикл планувальника (Ctrl+C - зупинка з закриттям відкритих extract'ів)"""
+        self.load_products()
+        try:
+            while True:
+                now = datetime.now()
+                if now >= self.next_discovery:
+                    for source_name in self.sources:
+                        try:
+                            self.discover(source_name)
+                        except Exception as e:
+                            logger.error(f"Discovery failed for {source_name}: {e}")
+                    self.next_discovery = now + self.discovery_interval
+
+                if not self.queue:
+                    time.sleep(self.poll_seconds)
+                    continue
+
+                due, _, _, key = self.queue[0]
+                product = self.products.get(key)
+                if product is None or product['due'] != due:
+                    # Застарілий запис: продукт вже перепланований
+                    heapq.heappop(self.queue)
+                    continue
+
+                if due > now:
+                    # Поки чекаємо - закрити пачки, щоб нові відгуки не висіли в RAW
+                    self.close_all_batches()
+                    time.sleep(min(self.poll_seconds, (due - now).total_seconds()))
+                    continue
+
+                heapq.heappop(self.queue)
+                budget = self.budgets[product['source']]
+                # Повторний скрапінг - HTTP-запит і, якщо відгуків у HTML немає, фолбек на
+                # Parsera. Починаємо, лише коли бюджет покриває обидва, щоб фолбек не пропускався
+                wait = budget.seconds_until_available(min(REFETCH_REQUESTS, budget.capacity))
+                if wait > 0:
+                    self._schedule(key, due=now + timedelta(seconds=wait))
+                    continue
+                budget.try_consume()
+
+                try:
+                    self.refetch(key)
+                    self._schedule(key)
+                except Exception as e:
+                    logger.error(f"Refetch failed for {product['url']}: {e}")
+                    self._schedule(key, due=now + self.min_interval)
+        except KeyboardInterrupt:
+            logger.info("Scheduler stopped")
+        finally:
+            self.close_all_batches()
+
+
+if __name__ == "__main__":
+    RecrawlScheduler().run_forever()
@@ -1,33 +1,50 @@
+import re
 import mysql.connector
 import logging
 from datetime import datetime
 import yaml
-import openai
-from langchain_openai import ChatOpenAI
+
+from llm import create_llm, model_name
+from migrations import migrate
+import queries
+from dedup import NearDuplicateIndex
+import rollup
+from log_setup import log_context
 
 # logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+_SENTIMENT_LINE_RE = re.compile(r'Відгук\s*(\d+)\s*[:\-][^\n]*?\b(negative|neutral|positive)', re.IGNORECASE)
+
 class Transformer:
     def __init__(self, config_path='config/api_keys.yaml'):
         self.config = self._load_config(config_path)
         self.conn = None
         self.similarity_threshold = 0.9
 
-        # --- LLM via openrouter.ai (Xiaomi MiMo-V2-Flash) ---
-        openrouter_conf = self.config.get('openrouter', {})
-        api_key = openrouter_conf.get('api_key')
-        base_url = openrouter_conf.get('base_url', 'https://openrouter.ai/api/v1')
-        model = openrouter_conf.get('model', 'mistralai/MiMo-V2-Flash')
-
-        # LangChain OpenAI wrapper supports custom endpoint via openai_api_base
-        self.llm = ChatOpenAI(
-            model=model,
-            openai_api_key=api_key,
-            openai_api_base=base_url,
-            temperature=0.0,
-            timeout=120,
-        )
+        # Потоковий режим: RAW читається чанками по rr_id, кожен чанк комітиться окремо
+        transform_conf = self.config.get('transform', {})
+        self.chunked = transform_conf.get('chunked', False)
+        self.chunk_size = transform_conf.get('chunk_size', 500)
+        # Скільки відгуків іде в один запит до LLM (не залежить від chunk_size)
+        self.sentiment_batch_size = transform_conf.get('sentiment_batch_size', 20)
+
+        # Згортання майже-дублікатів (MinHash + LSH) перед аналізом сентименту
+        dedup_conf = self.config.get('dedup', {})
+        self.dedup_index = None
+        if dedup_conf.get('enabled', True):
+            self.dedup_index = NearDuplicateIndex(threshold=dedup_conf.get('threshold', 0.8))
+
+        # Пишеться в rc_sentiment_model - backfill перераховує відгуки, оцінені іншою моделлю
+        self.model_name = model_name(self.config)
+        # LLM (openrouter.ai, src/llm.py) створюється при першому аналізі сентименту
+        self._llm = None
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = create_llm(self.config)
+        return self._llm
 
     def _load_config(self, path):
         with open(path, 'r', encoding='utf-8') as f:
@@ -49,55 +66,28 @@ class Transformer:
             raise
     
     def _init_core_tables(self):
-        cursor = self.conn.cursor()
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Product_CORE (
-                pc_id INT AUTO_INCREMENT PRIMARY KEY,
-                pc_desc TEXT NOT NULL,
-                pc_hash VARCHAR(32) UNIQUE NOT NULL
-            )
-        ''')
-        
-        # Review_CORE table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Review_CORE (
-                rc_id INT AUTO_INCREMENT PRIMARY KEY,
-                pc_fk_rc INT NOT NULL,
-                rc_text TEXT NOT NULL,
-                rc_source INT NOT NULL,
-                rc_date DATE NOT NULL,
-                rc_sentiment ENUM('negative', 'neutral', 'positive'),
-                rc_hash VARCHAR(32) UNIQUE NOT NULL,
-                FOREIGN KEY (pc_fk_rc) REFERENCES Product_CORE(pc_id)
-            )
-        ''')
-    
-        self.conn.commit()
+        # Схема створюється і оновлюється версійованими міграціями (src/migrations.py)
+        migrate(self.conn)
+        if self.dedup_index:
+            # Ключі Review_LSH мають відповідати поточним параметрам MinHash/LSH
+            self.dedup_index.ensure_params(self.conn)
     
     def find_similar_products(self, product_names):
         """Шукає схожі продукти в Product_CORE для групи продуктів через хеш"""
         cursor = self.conn.cursor(dictionary=True)
-        cursor.execute('SELECT pc_id, pc_hash FROM Product_CORE')
-        existing_products = cursor.fetchall()
-
-        similar_products = {}
-        for product_name in product_names:
-            product_hash = self._generate_hash(product_name)
-            for existing in existing_products:
-                if existing['pc_hash'] == product_hash:
-                    similar_products[product_name] = existing['pc_id']
-                    break
-
-        return similar_products
+        return self._lookup_product_ids(cursor, product_names)
 
     def _generate_hash(self, product_name):
-        """Генерує хеш для продукту"""
+        """Генерує хеш для продукту (16 байт, колонка BINARY(16))"""
         import hashlib
-        return hashlib.md5(product_name.encode('utf-8')).hexdigest()
+        return hashlib.md5(product_name.encode('utf-8')).digest()
     
     def analyze_review_sentiment(self, review_texts):
-        """Analyzes sentiment for multiple reviews via a single LLM request"""
+        """Analyzes sentiment for multiple reviews via a single LLM request.
+
+        Повертає список сентиментів у порядку review_texts; None - відгук не вдалось
+        оцінити (такі рядки пишуться з NULL і підхоплюються backfill'ом).
+        """
         try:
             # Формування єдиного запиту для аналізу кількох відгуків
             prompt = "Проаналізуй сентимент цих відгуків:\n\n"
@@ -106,32 +96,23 @@ class Transformer:
 
             prompt += "\nВизнач для кожного відгуку:\n1. Сентимент: negative, neutral, або positive\n\nВідповідь дай у форматі: Відгук <номер>: сентимент"
 
-            resp = self.llm(
-                messages=[{"role": "user", "content": prompt}]
-            )
-
-            # Обробка відповіді
-            logger.debug(f"LLM response: {resp}")
-            response_content = resp['choices'][0]['message']['content']
-            lines = response_content.strip().split("\n")
+            resp = self.llm.invoke(prompt)
 
-            sentiments = []
-            for line in lines:
-                parts = line.split(": ")[1].split(",")
-                if len(parts) == 2:
-                    sentiment = parts[0].strip()
-
-                    if sentiment in ['negative', 'neutral', 'positive']:
-                        sentiments.append((sentiment))
-                    else:
-                        sentiments.append(('neutral'))
-                else:
-                    sentiments.append(('neutral'))
+            # Обробка відповіді: рядки "Відгук <номер>: сентимент", номер - індекс відгуку
+            logger.debug("LLM response: %s", resp.content)
+            sentiments = [None] * len(review_texts)
+            for number, sentiment in _SENTIMENT_LINE_RE.findall(resp.content):
+                index = int(number) - 1
+                if 0 <= index < len(review_texts):
+                    sentiments[index] = sentiment.lower()
 
+            missing = sentiments.count(None)
+            if missing:
+                logger.warning("LLM returned no sentiment for %s of %s reviews", missing, len(review_texts))
             return sentiments
         except Exception as e:
             logger.error(f"Error analyzing sentiment: {e}")
-            return [('neutral')] * len(review_texts)
+            return [None] * len(review_texts)
     
     def transform_extract(self, extract_id):
         """Трансформує дані з RAW в CORE для конкретного extract_id"""
@@ -140,12 +121,7 @@ class Transformer:
             cursor = self.conn.cursor(dictionary=True)
 
             # Отримати всі продукти з RAW для цього extract
-            cursor.execute('''
-                SELECT pr.*, e.extract_fk_source
-                FROM Product_RAW pr
-                JOIN Extracts e ON pr.extract_fk_pr = e.extract_id
-                WHERE pr.extract_fk_pr = %s
-            ''', (extract_id,))
+            cursor.execute(queries.TRANSFORM_PRODUCTS, (extract_id,))
 
             raw_products = cursor.fetchall()
             logger.info(f"Processing {len(raw_products)} products from extract {extract_id}")
@@ -153,94 +129,219 @@ class Transformer:
             product_names = [raw_product['pr_name'] for raw_product in raw_products]
             similar_products = self.find_similar_products(product_names)
 
-            # Зібрати всі відгуки для пакетного аналізу
-            all_reviews = []
-            review_map = {}
+            # Зібрати всі нові відгуки для пакетного аналізу
+            pending = []
 
             for raw_product in raw_products:
                 product_name = raw_product['pr_name']
                 similar_pc_id = similar_products.get(product_name)
 
                 if similar_pc_id:
-                    # Продукт вже існує
-                    logger.info(f"Product already exists: {product_name}")
+                    # Продукт вже існує - оновити кількість відгуків з магазину
+                    logger.info("Product already exists: %s", product_name)
                     pc_id = similar_pc_id
+                    cursor.execute('''
+                        UPDATE Product_CORE SET pc_review_count = %s WHERE pc_id = %s
+                    ''', (raw_product['pr_review_count'], pc_id))
+                    self.conn.commit()
                 else:
                     # Створити новий продукт в CORE
                     try:
                         cursor.execute('''
-                            INSERT INTO Product_CORE (pc_desc, pc_hash)
-                            VALUES (%s, %s)
-                        ''', (product_name, self._generate_hash(product_name)))
+                            INSERT INTO Product_CORE (pc_desc, pc_hash, pc_review_count)
+                            VALUES (%s, %s, %s)
+                        ''', (product_name, self._generate_hash(product_name),
+                              raw_product['pr_review_count']))
                         self.conn.commit()
-                        logger.info(f"Created new product in CORE: {product_name}")
+                        logger.info("Created new product in CORE: %s", product_name)
                     except mysql.connector.IntegrityError as e:
                         if e.errno == 1062:  # Duplicate entry
-                            logger.warning(f"Duplicate product detected: {product_name}")
+                            logger.warning("Duplicate product detected: %s", product_name)
                         else:
                             raise
 
                     pc_id = cursor.lastrowid
                     self.conn.commit()
-                    logger.info(f"Created new product in CORE: {product_name}")
+                    logger.info("Created new product in CORE: %s", product_name)
 
                 # Отримати всі відгуки для продукту
-                cursor.execute('''
-                    SELECT * FROM Review_RAW WHERE pr_fk_rr = %s
-                ''', (raw_product['pr_id'],))
+                cursor.execute(queries.PRODUCT_RAW_REVIEWS, (raw_product['pr_id'],))
 
                 raw_reviews = cursor.fetchall()
 
-                for raw_review in raw_reviews:
-                    # Перевірити чи відгук вже існує (по hash)
-                    cursor.execute('SELECT rc_id FROM Review_CORE WHERE rc_hash = %s', 
-                                (raw_review['rr_hash'],))
+                # Перевірити чи відгук вже існує (по hash, в CORE або серед майже-дублікатів)
+                existing = self._existing_review_hashes(
+                    cursor, [bytes(raw_review['rr_hash']) for raw_review in raw_reviews])
 
-                    if cursor.fetchone():
-                        logger.debug(f"Review already exists: {raw_review['rr_hash']}")
+                for raw_review in raw_reviews:
+                    if bytes(raw_review['rr_hash']) in existing:
+                        logger.debug("Review already exists: rr_id %s", raw_review['rr_id'])
                         continue
 
                     # Додати відгук до списку для аналізу
-                    all_reviews.append(raw_review['rr_text'])
-                    review_map[raw_review['rr_text']] = {
+                    pending.append({
                         'pc_id': pc_id,
-                        'raw_review': raw_review,
-                        'source': raw_product['extract_fk_source']
-                    }
+                        'text': raw_review['rr_text'],
+                        'date': raw_review['rr_date'],
+                        'source': raw_product['extract_fk_source'],
+                        'hash': bytes(raw_review['rr_hash'])
+                    })
+
+            # Згорнути майже-дублікати, проаналізувати сентимент і додати до CORE
+            self._store_reviews(cursor, pending)
+            self.conn.commit()
+
+            logger.info(f"Transformation completed for extract {extract_id}")
 
-            # Аналіз сентименту для всіх відгуків
-            sentiments = self.analyze_review_sentiment(all_reviews)
+        except Exception as e:
+            logger.error(f"Transformation failed: {e}")
+            raise
+        finally:
+            if self.conn:
+                self.conn.close()
+    
+    def _ensure_products_in_core(self, cursor, extract_id):
+        """Створює в Product_CORE відсутні продукти extract'у, читаючи Product_RAW чанками по pr_id"""
+        last_pr_id = 0
+        while True:
+            cursor.execute(queries.CHUNK_PRODUCTS, (extract_id, last_pr_id, self.chunk_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_pr_id = rows[-1]['pr_id']
+
+            cursor.executemany('''
+                INSERT INTO Product_CORE (pc_desc, pc_hash, pc_review_count)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE pc_review_count = VALUES(pc_review_count)
+            ''', [(row['pr_name'], self._generate_hash(row['pr_name']), row['pr_review_count'])
+                  for row in rows])
+            self.conn.commit()
 
-            # Додати результати аналізу до CORE
-            for review_text, sentiment in zip(all_reviews, sentiments):
-                review_data = review_map[review_text]
-                raw_review = review_data['raw_review']
+    def _lookup_product_ids(self, cursor, product_names):
+        """Повертає {pr_name: pc_id} для назв продуктів одного чанку"""
+        hashes = {self._generate_hash(name): name for name in set(product_names)}
+        if not hashes:
+            return {}
+        cursor.execute(queries.PRODUCT_IDS_BY_HASH.format(placeholders=queries.placeholders(len(hashes))),
+                       tuple(hashes))
+        return {hashes[bytes(row['pc_hash'])]: row['pc_id'] for row in cursor.fetchall()}
+
+    def _existing_review_hashes(self, cursor, review_hashes):
+        """Повертає множину хешів, які вже є в Review_CORE або Review_NEAR_DUP"""
+        if not review_hashes:
+            return set()
+        sql = queries.EXISTING_REVIEW_HASHES.format(placeholders=queries.placeholders(len(review_hashes)))
+        cursor.execute(sql, tuple(review_hashes) * 2)
+        return {bytes(row['review_hash']) for row in cursor.fetchall()}
+
+    def _store_reviews(self, cursor, pending):
+        """Згортає майже-дублікати, аналізує сентимент і пише відгуки в Review_CORE.
+
+        pending - список dict(pc_id, text, date, source, hash). Майже-дублікати не
+        потрапляють в Review_CORE і не йдуть на LLM, а зберігаються в Review_NEAR_DUP
+        з посиланням на канонічний відгук. Агрегати Product_SUMMARY оновлюються тут же,
+        в тій самій транзакції. Коміт робить викликач.
+        Повертає кількість нових рядків у Review_CORE.
+        """
+        if self.dedup_index:
+            unique, duplicates = self.dedup_index.collapse(cursor, pending)
+        else:
+            unique, duplicates = pending, []
+        if not unique and not duplicates:
+            return 0
+
+        sentiments = []
+        for start in range(0, len(unique), self.sentiment_batch_size):
+            batch = unique[start:start + self.sentiment_batch_size]
+            sentiments.extend(self.analyze_review_sentiment([review['text'] for review in batch]))
+
+        stored = []
+        for review, sentiment in zip(unique, sentiments):
+            try:
+                cursor.execute('''
+                    INSERT INTO Review_CORE
+                    (pc_fk_rc, rc_text, rc_source, rc_date, rc_sentiment, rc_sentiment_model, rc_hash)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ''', (review['pc_id'], review['text'], review['source'], review['date'],
+                      sentiment, self.model_name if sentiment else None, review['hash']))
+                review['rc_id'] = cursor.lastrowid
+                stored.append({'pc_id': review['pc_id'], 'sentiment': sentiment,
+                               'date': review['date'], 'source': review['source']})
+                if self.dedup_index:
+                    self.dedup_index.add(cursor, review['pc_id'], review['rc_id'], review['_bands'])
+
+                logger.debug("Added review to CORE: rc_id %s", review['rc_id'])
+
+            except Exception as e:
+                logger.error("Error processing review: %s", e)
+                continue
+
+        for review, canonical, similarity in duplicates:
+            if canonical.get('rc_id') is None:
+                # Канонічний відгук не вдалось зберегти - дублікат обробиться наступним запуском
+                continue
+            cursor.execute('''
+                INSERT IGNORE INTO Review_NEAR_DUP
+                (rc_fk_nd, nd_text, nd_date, nd_source, nd_similarity, nd_hash)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            ''', (canonical['rc_id'], review['text'], review['date'], review['source'],
+                  similarity, review['hash']))
+
+        rollup.add_reviews(cursor, stored)
+        return len(stored)
+
+    def transform_extract_chunked(self, extract_id):
+        """Трансформує extract чанками фіксованого розміру.
+
+        Відгуки з RAW читаються небуферизованим курсором з keyset-пагінацією по rr_id,
+        кожен чанк аналізується і комітиться окремо - пам'ять не росте з розміром
+        extract'у, а при падінні втрачається не більше одного чанку.
+        """
+        try:
+            self._connect_db()
+            cursor = self.conn.cursor(dictionary=True, buffered=False)
 
-                try:
-                    cursor.execute('''
-                        INSERT INTO Review_CORE 
-                        (pc_fk_rc, rc_text, rc_source, rc_date, rc_sentiment, rc_hash)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                    ''', (review_data['pc_id'], raw_review['rr_text'], review_data['source'],
-                        raw_review['rr_date'], sentiment, raw_review['rr_hash']))
+            self._ensure_products_in_core(cursor, extract_id)
 
-                    logger.debug(f"Added review to CORE: {raw_review['rr_hash']}")
+            last_rr_id = 0
+            total_added = 0
+            while True:
+                cursor.execute(queries.CHUNK_REVIEWS, (extract_id, last_rr_id, self.chunk_size))
+                chunk = cursor.fetchall()
+                if not chunk:
+                    break
+                last_rr_id = chunk[-1]['rr_id']
 
-                except Exception as e:
-                    logger.error(f"Error processing review: {e}")
+                existing = self._existing_review_hashes(cursor, [bytes(row['rr_hash']) for row in chunk])
+                new_reviews = [row for row in chunk if bytes(row['rr_hash']) not in existing]
+                if not new_reviews:
                     continue
 
-            self.conn.commit()
+                pc_ids = self._lookup_product_ids(cursor, [row['pr_name'] for row in new_reviews])
+                pending = [{
+                    'pc_id': pc_ids[row['pr_name']],
+                    'text': row['rr_text'],
+                    'date': row['rr_date'],
+                    'source': row['extract_fk_source'],
+                    'hash': bytes(row['rr_hash'])
+                } for row in new_reviews]
 
-            logger.info(f"Transformation completed for extract {extract_id}")
+                added = self._store_reviews(cursor, pending)
+                self.conn.commit()
+
+                total_added += added
+                logger.info("Committed chunk up to rr_id %s: %s new reviews", last_rr_id, added)
+
+            logger.info(f"Chunked transformation completed for extract {extract_id}: {total_added} reviews")
 
         except Exception as e:
-            logger.error(f"Transformation failed: {e}")
+            logger.error(f"Chunked transformation failed: {e}")
             raise
         finally:
             if self.conn:
                 self.conn.close()
-    
+
     def transform_all_successful_extracts(self):
         """Трансформує всі успішні extract'и, які ще не оброблені"""
         try:
@@ -248,15 +349,17 @@ class Transformer:
             cursor = self.conn.cursor()
             
             # Знайти всі успішні extracts
-            cursor.execute('''
-                SELECT extract_id FROM Extracts WHERE extract_status = 'success'
-            ''')
+            cursor.execute(queries.SUCCESSFUL_EXTRACTS)
             
             extracts = cursor.fetchall()
             
             for extract in extracts:
-                logger.info(f"Transforming extract {extract[0]}")
-                self.transform_extract(extract[0])
+                with log_context(extract_id=extract[0]):
+                    logger.info(f"Transforming extract {extract[0]}")
+                    if self.chunked:
+                        self.transform_extract_chunked(extract[0])
+                    else:
+                        self.transform_extract(extract[0])
             
         finally:
             if self.conn:
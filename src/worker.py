@@ -0,0 +1,210 @@
+"""
+Розподілена черга задач для extract'у.
+
+Після збереження продуктів extract ділиться на задачі "зібрати відгуки продукту"
+в таблиці Extract_JOBS. Будь-яка кількість процесів (на різних машинах, з різних
+IP) забирає задачі через SELECT ... FOR UPDATE SKIP LOCKED з орендою (lease):
+якщо воркер помер, після job_lease_until задача знову доступна іншим.
+Extract отримує статус success, лише коли всі його задачі виконані; воркер,
+який закрив останню задачу, і фіналізує extract.
+
+Локальна перевірка - кілька процесів проти одного MySQL:
+    python run_retl.py worker --processes 4 --exit-when-idle
+"""
+
+import os
+import time
+import socket
+import logging
+import multiprocessing
+
+import queries
+from extract import Extractor
+from log_setup import log_context, set_log_context
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_jobs(conn, extract_id):
+    """Створює по задачі на кожен продукт extract'у. Повертає кількість задач"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT IGNORE INTO Extract_JOBS (extract_fk_job, pr_fk_job)
+        SELECT extract_fk_pr, pr_id FROM Product_RAW WHERE extract_fk_pr = %s
+    ''', (extract_id,))
+    conn.commit()
+    logger.info(f"Queued {cursor.rowcount} jobs for extract {extract_id}")
+    return cursor.rowcount
+
+
+class Worker:
+    def __init__(self, config_path='config/api_keys.yaml', worker_id=None):
+        self.extractor = Extractor(config_path)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+        dist_conf = self.extractor.config.get('distributed', {})
+        self.lease_seconds = dist_conf.get('lease_seconds', 300)
+        self.max_attempts = dist_conf.get('max_attempts', 3)
+        self.poll_seconds = dist_conf.get('poll_seconds', 5)
+
+    @property
+    def conn(self):
+        return self.extractor.conn
+
+    def claim(self, extract_id=None):
+        """Забирає одну задачу (нову або з простроченою орендою). Повертає dict або None"""
+        cursor = self.conn.cursor(dictionary=True)
+        extract_filter = queries.CLAIM_JOB_EXTRACT_FILTER if extract_id else ''
+        params = (extract_id,) if extract_id else ()
+
+        while True:
+            cursor.execute(queries.CLAIM_JOB.format(extract_filter=extract_filter), params)
+            job = cursor.fetchone()
+            if job is None:
+                self.conn.commit()
+                return None
+
+            if job['job_attempts'] >= self.max_attempts:
+                # Воркери помирали на цій задачі забагато разів
+                cursor.execute('''
+                    UPDATE Extract_JOBS SET job_status = 'failed', job_error = 'lease expired too many times'
+                    WHERE job_id = %s
+                ''', (job['job_id'],))
+                self.conn.commit()
+                self._finalize_extract(job['extract_fk_job'])
+                continue
+
+            cursor.execute('''
+                UPDATE Extract_JOBS
+                SET job_status = 'claimed', job_worker = %s,
+                    job_lease_until = NOW() + INTERVAL %s SECOND,
+                    job_attempts = job_attempts + 1
+                WHERE job_id = %s
+            ''', (self.worker_id, self.lease_seconds, job['job_id']))
+            self.conn.commit()
+            return job
+
+    def _renew_lease(self, job_id):
+        """Продовжує оренду. False - задачу вже забрав інший воркер"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            UPDATE Extract_JOBS SET job_lease_until = NOW() + INTERVAL %s SECOND
+            WHERE job_id = %s AND job_worker = %s AND job_status = 'claimed'
+        ''', (self.lease_seconds, job_id, self.worker_id))
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def _finish(self, job, status, error=None):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            UPDATE Extract_JOBS SET job_status = %s, job_error = %s, job_lease_until = NULL
+            WHERE job_id = %s AND job_worker = %s
+        ''', (status, error, job['job_id'], self.worker_id))
+        self.conn.commit()
+        self._finalize_extract(job['extract_fk_job'])
+
+    def _finalize_extract(self, extract_id):
+        """Закриває extract, якщо відкритих задач не лишилось (рівно один воркер виграє UPDATE)"""
+        cursor = self.conn.cursor(dictionary=True)
+        cursor.execute(queries.EXTRACT_JOB_COUNTS, (extract_id,))
+        counts = cursor.fetchone()
+        if counts['open_jobs']:
+            return
+
+        status = 'failed' if counts['failed_jobs'] else 'success'
+        cursor.execute('''
+            UPDATE Extracts SET extract_status = %s
+            WHERE extract_id = %s AND extract_status = 'pending'
+        ''', (status, extract_id))
+        self.conn.commit()
+        if cursor.rowcount == 0:
+            return
+
+        logger.info(f"Extract {extract_id} finalized by {self.worker_id}: {status}")
+        if status == 'failed':
+            self.extractor.current_extract_id = extract_id
+            self.extractor.cleanup()
+
+    def process(self, job):
+        with log_context(extract_id=job['extract_fk_job'], product_id=job['pr_fk_job']):
+            try:
+                self.extractor.current_extract_id = job['extract_fk_job']
+                self.extractor.current_source_id = job['extract_fk_source']
+                reviews = self.extractor.fetch_reviews_from_parsera(job['pr_url_full'])
+                if not self._renew_lease(job['job_id']):
+                    logger.warning("Lost lease on job %s, skipping save", job['job_id'])
+                    return
+                # Повторне збереження після падіння безпечне: rr_hash UNIQUE + INSERT IGNORE
+                saved = self.extractor.save_reviews(job['pr_fk_job'], reviews)
+                logger.info("Saved %s reviews for product %s", saved, job['pr_fk_job'])
+                self._finish(job, 'done')
+            except Exception as e:
+                logger.error(f"Job {job['job_id']} failed: {e}")
+                self.conn.rollback()
+                if job['job_attempts'] + 1 >= self.max_attempts:
+                    self._finish(job, 'failed', str(e))
+                else:
+                    # Повернути в чергу для іншої спроби
+                    cursor = self.conn.cursor()
+                    cursor.execute('''
+                        UPDATE Extract_JOBS SET job_status = 'queued', job_error = %s, job_lease_until = NULL
+                        WHERE job_id = %s AND job_worker = %s
+                    ''', (str(e), job['job_id'], self.worker_id))
+                    self.conn.commit()
+
+    def extract_status(self, extract_id):
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT extract_status FROM Extracts WHERE extract_id = %s', (extract_id,))
+        row = cursor.fetchone()
+        self.conn.commit()
+        return row[0] if row else None
+
+    def run(self, extract_id=None, exit_when_idle=False):
+        """Цикл воркера. З extract_id - працює, доки цей extract не буде закрито"""
+        set_log_context(worker=self.worker_id)
+        self.extractor._connect_db()
+        processed = 0
+        try:
+            while True:
+                job = self.claim(extract_id)
+                if job:
+                    self.process(job)
+                    processed += 1
+                    continue
+
+                if extract_id and self.extract_status(extract_id) != 'pending':
+                    break
+                if exit_when_idle and not extract_id:
+                    break
+                time.sleep(self.poll_seconds)
+        finally:
+            self.conn.close()
+        logger.info(f"Worker {self.worker_id} stopped after {processed} jobs")
+        return processed
+
+
+def _worker_process(config_path, extract_id, exit_when_idle, index):
+    import atexit
+    from log_setup import setup_logging
+    _, listener = setup_logging(log_dir='logs', filename=f'worker-{index}.jsonl')
+    try:
+        Worker(config_path).run(extract_id=extract_id, exit_when_idle=exit_when_idle)
+    finally:
+        # Дочірній процес (fork) виходить через os._exit без atexit - зупинити listener
+        # явно, щоб останні записи з черги потрапили у файл
+        listener.stop()
+        atexit.unregister(listener.stop)
+
+
+def run_workers(config_path='config/api_keys.yaml', processes=1, extract_id=None, exit_when_idle=False):
+    """Запускає кілька процесів-воркерів на цій машині і чекає їх завершення"""
+    if processes <= 1:
+        return Worker(config_path).run(extract_id=extract_id, exit_when_idle=exit_when_idle)
+
+    workers = [multiprocessing.Process(target=_worker_process,
+                                       args=(config_path, extract_id, exit_when_idle, index))
+               for index in range(processes)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
@@ -0,0 +1,80 @@
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from dedup import NearDuplicateIndex, comparable, normalize_text, shingles
+
+BASE = ('Крем чудово зволожує шкіру, добре вбирається, не залишає жирного блиску '
+        'і має приємний легкий аромат')
+COMPLAINT = ('Але друга банка прийшла з пошкодженою кришкою, крем висох, '
+             'служба підтримки так і не відповіла на мої листи')
+
+
+class StubCursor:
+    """Dictionary-курсор: кожен fetchall() повертає наступний результат з results"""
+
+    def __init__(self, results=()):
+        self.results = list(results)
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def fetchall(self):
+        return self.results.pop(0) if self.results else []
+
+
+def review(text, day=1, pc_id=1):
+    return {'pc_id': pc_id, 'text': text, 'date': date(2024, 5, day)}
+
+
+def test_normalize_text_drops_dates_punctuation_and_case():
+    assert normalize_text('  Супер!!  Крем, 12.05.2024 рекомендую ') == 'супер крем рекомендую'
+    assert normalize_text('Відгук від 06 серпня 2022: добре') == 'відгук від добре'
+    assert normalize_text(None) == ''
+
+
+def test_comparable_keeps_short_reviews_from_different_dates_apart():
+    short = shingles('Дуже задоволена!')
+    long = shingles(BASE)
+    assert not comparable(short, date(2024, 5, 1), short, date(2024, 5, 2))
+    assert comparable(short, date(2024, 5, 1), short, date(2024, 5, 1))
+    assert comparable(long, date(2024, 5, 1), long, date(2024, 5, 2))
+
+
+def test_collapse_merges_whitespace_date_and_truncation_variants():
+    index = NearDuplicateIndex(threshold=0.8)
+    reviews = [review(BASE), review('  ' + BASE.upper() + ' 01.05.2024'), review(BASE.rsplit(' ', 2)[0])]
+    unique, duplicates = index.collapse(StubCursor(), reviews)
+    assert unique == [reviews[0]]
+    assert [(dup, canonical) for dup, canonical, _ in duplicates] == [(reviews[1], reviews[0]),
+                                                                      (reviews[2], reviews[0])]
+
+
+def test_collapse_keeps_longer_review_that_adds_text():
+    index = NearDuplicateIndex(threshold=0.8)
+    reviews = [review(BASE, day=1), review(BASE + '. ' + COMPLAINT, day=20)]
+    unique, duplicates = index.collapse(StubCursor(), reviews)
+    assert unique == reviews
+    assert duplicates == []
+
+
+def test_collapse_keeps_short_reviews_from_different_dates():
+    index = NearDuplicateIndex(threshold=0.8)
+    reviews = [review('Дуже задоволена!', day=1), review('Дуже задоволена', day=2)]
+    unique, duplicates = index.collapse(StubCursor(), reviews)
+    assert unique == reviews
+
+
+def test_collapse_finds_canonical_in_core():
+    index = NearDuplicateIndex(threshold=0.8)
+    cursor = StubCursor([
+        [{'rc_fk_rl': 7}],
+        [{'rc_id': 7, 'rc_text': BASE, 'rc_date': date(2024, 5, 1)}],
+    ])
+    unique, duplicates = index.collapse(cursor, [review(BASE + '!!', day=3)])
+    assert unique == []
+    assert duplicates[0][1] == {'rc_id': 7}
+    assert duplicates[0][2] == 1.0
@@ -0,0 +1,56 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from keywords import AhoCorasick, KeywordFilter, normalize
+
+SANVITA = {'name': 'sanvita', 'include': ['sanvita', 'санвіта'], 'exclude': ['набір']}
+
+
+def test_normalize_transliterates_and_strips():
+    assert normalize('Санвіта — Крем, 50ml!') == ' sanvita krem 50ml '
+    assert normalize(None) == '  '
+
+
+def test_normalize_folds_uk_ru_variants():
+    assert normalize('Санвита') == normalize('Санвіта') == normalize('sanvita')
+    assert normalize('Санвыта') == normalize('sanvyta') == normalize('sanvita')
+    assert normalize('крем') == normalize('крэм') == normalize('крєм')
+
+
+def test_aho_corasick_positions():
+    automaton = AhoCorasick()
+    for word in ('he', 'she', 'hers'):
+        automaton.add(word, word)
+    automaton.build()
+    assert sorted(automaton.iter_matches('ushers')) == [(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')]
+
+
+def test_match_uk_ru_latin_names():
+    keyword_filter = KeywordFilter(brands=[SANVITA], noise_words=[])
+    assert keyword_filter.match('Санвита крем') == 'sanvita'
+    assert keyword_filter.match('Санвіта крем') == 'sanvita'
+    assert keyword_filter.match('SANVITA cream') == 'sanvita'
+    assert keyword_filter.match('Інший крем') is None
+
+
+def test_match_excludes_noise_and_brand_words():
+    keyword_filter = KeywordFilter(brands=[SANVITA])
+    assert keyword_filter.match('Sanvita туалетна вода') is None
+    assert keyword_filter.match('Санвіта подарунковий набір') is None
+
+
+def test_match_respects_word_boundaries():
+    keyword_filter = KeywordFilter(noise_words=['eau', 'ml'])
+    assert keyword_filter.match('Beauty serum') == ''
+    assert keyword_filter.match('Serum 50ml') is None
+
+
+def test_match_without_brands_returns_empty_string():
+    assert KeywordFilter(noise_words=[]).match('Будь-який продукт') == ''
+
+
+def test_from_config_defaults_to_default_noise_words():
+    assert KeywordFilter.from_config({}).match('Санвіта туалетна вода') is None
+    assert KeywordFilter.from_config({'filters': {'noise_words': []}}).match('Санвіта туалетна вода') == ''
@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from listing import ListingExtractor, get_listing_extractor
+
+PAGE_URL = 'https://shop.example/ua/search/?q=sanvita'
+
+
+def card(product_id, name, count_text=''):
+    return (f'<div class="card"><a href="/ua/product/{product_id}/"><img alt=""></a>'
+            f'<a href="/ua/product/{product_id}/" class="title">{name}</a>'
+            f'<span class="rating">{count_text}</span></div>')
+
+
+def page(cards, extra=''):
+    return f'<html><body><div class="grid">{"".join(cards)}</div>{extra}</body></html>'
+
+
+def json_ld(data):
+    return f'<script type="application/ld+json">{json.dumps(data, ensure_ascii=False)}</script>'
+
+
+def by_url(products):
+    return {product['product_url']: product for product in products}
+
+
+def test_html_cards_with_review_counts():
+    html = page([card(1, 'Санвіта крем', '12 відгуків'),
+                 card(2, 'Санвіта маска', 'Відгуки: 3'),
+                 card(3, 'Санвіта сироватка', 'Reviews (7)')])
+    products = by_url(ListingExtractor(r'/ua/product/\d+/?').parse(html, PAGE_URL))
+    assert products == {
+        '/ua/product/1/': {'product_name': 'Санвіта крем', 'product_url': '/ua/product/1/',
+                           'product_reviews_count': 12},
+        '/ua/product/2/': {'product_name': 'Санвіта маска', 'product_url': '/ua/product/2/',
+                           'product_reviews_count': 3},
+        '/ua/product/3/': {'product_name': 'Санвіта сироватка', 'product_url': '/ua/product/3/',
+                           'product_reviews_count': 7},
+    }
+
+
+def test_missing_count_is_unknown_not_zero():
+    html = page([card(1, 'Санвіта крем'), card(2, 'Санвіта маска', '0 відгуків')])
+    products = by_url(ListingExtractor(r'/ua/product/\d+/?').parse(html, PAGE_URL))
+    assert products['/ua/product/1/']['product_reviews_count'] is None
+    assert products['/ua/product/2/']['product_reviews_count'] == 0
+
+
+def test_json_ld_item_list_merges_with_cards():
+    item_list = {
+        '@context': 'https://schema.org',
+        '@type': 'ItemList',
+        'itemListElement': [
+            {'@type': 'ListItem', 'position': 1, 'item': {
+                '@type': 'Product', 'name': 'Санвіта крем 50 мл', 'url': 'https://shop.example/ua/product/1/',
+                'aggregateRating': {'ratingValue': 4.8, 'reviewCount': 15}}},
+            {'@type': 'ListItem', 'position': 2, 'item': {
+                '@type': 'Product', 'name': 'Санвіта маска', 'url': '/ua/product/2/'}},
+            {'@type': 'ListItem', 'position': 3, 'item': {
+                '@type': 'Product', 'name': 'Доставка', 'url': '/ua/delivery/'}},
+        ],
+    }
+    html = page([card(1, 'Санвіта крем', '12 відгуків'), card(2, 'Санвіта маска', '4 відгуки')],
+                extra=json_ld(item_list))
+    products = by_url(ListingExtractor(r'/ua/product/\d+/?').parse(html, PAGE_URL))
+    assert set(products) == {'/ua/product/1/', '/ua/product/2/'}
+    # Назва з JSON-LD, кількість - більша з відомих; без aggregateRating лишається кількість з картки
+    assert products['/ua/product/1/']['product_name'] == 'Санвіта крем 50 мл'
+    assert products['/ua/product/1/']['product_reviews_count'] == 15
+    assert products['/ua/product/2/']['product_reviews_count'] == 4
+
+
+def test_json_ld_only_product_without_rating():
+    html = page([], extra=json_ld({'@graph': [{'@type': 'Product', 'name': 'Санвіта тонік',
+                                                '@id': '/ua/product/9/'}]}))
+    assert ListingExtractor(r'/ua/product/\d+/?').parse(html, PAGE_URL) == [
+        {'product_name': 'Санвіта тонік', 'product_url': '/ua/product/9/', 'product_reviews_count': None}]
+
+
+def test_page_urls_expand_query_template():
+    pagination = ''.join(f'<a href="?q=sanvita&page={page}">{page}</a>' for page in (2, 3, 5))
+    urls = ListingExtractor().page_urls(page([], extra=pagination), PAGE_URL)
+    assert urls == [f'https://shop.example/ua/search/?q=sanvita&page={page}' for page in (2, 3, 4, 5)]
+
+
+def test_page_urls_expand_path_template_up_to_max_pages():
+    pagination = '<a href="/ua/search/page-2/">2</a><a href="/ua/search/page-40/">40</a>'
+    urls = ListingExtractor(max_pages=4).page_urls(page([], extra=pagination), PAGE_URL)
+    assert urls == [f'https://shop.example/ua/search/page-{page}/' for page in (2, 3, 4)]
+
+
+def test_page_urls_without_pagination():
+    assert ListingExtractor().page_urls(page([card(1, 'Санвіта крем')]), PAGE_URL) == []
+
+
+def test_extractor_by_domain_and_overrides():
+    known = get_listing_extractor('https://www.makeup.com.ua/ua/search/?q=x')
+    assert known.product_url_re.pattern == r'/ua/product/\d+/?'
+    custom = get_listing_extractor('https://other.example/', {'product_url_pattern': r'/p/\d+', 'max_pages': 2})
+    assert (custom.product_url_re.pattern, custom.max_pages) == (r'/p/\d+', 2)
@@ -0,0 +1,32 @@
+import os
+import sys
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from log_setup import ContextFilter, log_context, with_log_context
+
+
+def _record(message):
+    record = logging.LogRecord('test', logging.INFO, __file__, 0, message, None, None)
+    ContextFilter().filter(record)
+    return record.run_id, record.extract_id, record.product_id
+
+
+def test_pool_threads_see_submitting_context():
+    with log_context(run_id='run-1', extract_id=42):
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            wrapped = list(pool.map(with_log_context(_record), ['a', 'b', 'c']))
+    assert wrapped == [('run-1', 42, None)] * 3
+
+
+def test_context_changes_inside_pool_do_not_leak():
+    def nested(message):
+        with log_context(product_id=7):
+            return _record(message)
+
+    with log_context(run_id='run-2'):
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            assert list(pool.map(with_log_context(nested), ['a'])) == [('run-2', None, 7)]
+        assert _record('b') == ('run-2', None, None)
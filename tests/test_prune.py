@@ -0,0 +1,46 @@
+import os
+import sys
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from prune import find_repeated_region, prune_html
+
+REVIEW = 'Чудовий крем, користуюсь другий місяць, шкіра стала м\'якшою і не лущиться. '
+
+
+def page(body):
+    return f'<html><head><script>track()</script></head><body>{body}</body></html>'
+
+
+def reviews_block(count=5, cls='reviews'):
+    items = ''.join(f'<div class="review-item"><p>{REVIEW}{i}</p><time datetime="2024-05-0{i + 1}">'
+                    f'{i + 1} травня</time></div>' for i in range(count))
+    return f'<section class="{cls}">{items}</section>'
+
+
+def test_find_repeated_region_picks_review_list():
+    menu = '<ul class="menu">' + ''.join(f'<li class="m">Пункт {i}</li>' for i in range(8)) + '</ul>'
+    soup = BeautifulSoup(page(menu + reviews_block()), 'html.parser')
+    region = find_repeated_region(soup.body)
+    assert region is not None
+    assert region['class'] == ['reviews']
+
+
+def test_find_repeated_region_needs_repeats_and_text():
+    too_few = BeautifulSoup(page(reviews_block(count=2)), 'html.parser')
+    assert find_repeated_region(too_few.body) is None
+
+    no_text = BeautifulSoup(page('<ul>' + '<li class="x">a</li>' * 10 + '</ul>'), 'html.parser')
+    assert find_repeated_region(no_text.body) is None
+
+
+def test_prune_html_keeps_region_without_boilerplate():
+    html = page('<header><nav>Меню</nav></header>' + reviews_block() + '<footer>(c) shop</footer>')
+    pruned = prune_html(html)
+    assert pruned.startswith('<section>')
+    assert REVIEW.strip() in pruned
+    assert 'datetime="2024-05-01"' in pruned
+    for removed in ('track()', 'Меню', '(c) shop', 'class='):
+        assert removed not in pruned